@@ -12,6 +12,12 @@ from sympy.abc import x,y,z
 from datetime import datetime
 import copy as cp
 import warnings
+import os
+import hashlib
+import json
+import ast
+import zipfile
+import SmithNormalForm as sn
 #import lammp
 from decimal import Decimal
 from mpl_toolkits.mplot3d import Axes3D 
@@ -211,10 +217,12 @@ class GeneralLattice(PureLattice,RealCell):
             self.__RealBasisVectors[j] = inLatticeParameters[j]*inBasisVectors[j]
          #default RemovedBoundaryPoints = []
         self.__blnFoundBoundaryPoints = False
+        self.__BoundaryPeriodicKey = None
         self.__Periodicity = ['p','p','p']
     def TranslateGrain(self, inVector):
         self.__RealPoints = self.__RealPoints+inVector
         self.__Origin = self.__Origin + inVector
+        self.ResetBoundaryPoints()
     def SetPeriodicity(self, inList):
         self.__Periodicity = inList
     def GetPeriodicity(self, intIndex = None):
@@ -242,6 +250,7 @@ class GeneralLattice(PureLattice,RealCell):
     def DeletePoints(self,lstDeletedIndices: list):
         self.DeleteLatticePoints(lstDeletedIndices)
         self.__RealPoints = np.delete(self.__RealPoints, lstDeletedIndices, axis=0) 
+        self.ResetBoundaryPoints()
     def GetRealPoints(self)->np.array: #if points on the boundary have been removed don't include them unless blnRemoved is set to false
         return self.__RealPoints
     def MakeRealPoints(self, inClosedConstraints: np.array):
@@ -262,6 +271,7 @@ class GeneralLattice(PureLattice,RealCell):
         arrRealPoints = np.round(np.matmul(inLatticePoints, self.GetRealCellVectors()),10)
         self.__RealPoints = np.round(np.matmul(arrRealPoints, self.GetUnitBasisVectors()),10)
         self.__RealPoints = np.add(self.__Origin, self.__RealPoints)
+        self.ResetBoundaryPoints()
     def CheckRealLinearConstraints(self,inPoints: np.array)-> np.array: #returns indices to delete for real coordinates  
         lstIndices = []
         for j in self.__LinearConstraints:
@@ -284,14 +294,9 @@ class GeneralLattice(PureLattice,RealCell):
         lstDeletedIndices = gf.CheckLinearEquality(self.__RealPoints, inPlane, 0.01)
         self.DeletePoints(lstDeletedIndices)
     def ApplyGeneralConstraint(self,strFunction, strVariables='[x,y,z]',fltTolerance = 1e-5, strDomain = ''): #default scalar value is less than or equal to 0 if "inside" the region
-        lstVariables = parse_expr(strVariables)
-        fltFunction = lambdify(lstVariables,parse_expr(strFunction))
-        arrFunction = lambda X : fltFunction(X[0],X[1],X[2])
-        arrLess = np.array(list(map(arrFunction, self.__RealPoints)))
+        arrLess = EvaluateConstraint(strFunction, self.__RealPoints, strVariables)
         if len(strDomain) >0 :
-            fltDomain = lambdify(lstVariables,parse_expr(strDomain))
-            arrDomain = lambda X : fltDomain(X[0],X[1],X[2])
-            arrDomain = np.array(list(map(arrDomain, self.__RealPoints)))
+            arrDomain = EvaluateConstraint(strDomain, self.__RealPoints, strVariables)
             lstDeletedIndices = np.where((arrLess > fltTolerance) & (arrDomain >= 0))[0]
         else:
             lstDeletedIndices = np.where(arrLess > fltTolerance)[0]
@@ -300,10 +305,17 @@ class GeneralLattice(PureLattice,RealCell):
         return gf.FCCQuaternionEquivalence(gf.GetQuaternionFromBasisMatrix(np.transpose(self.GetUnitBasisVectors())))     
     def GetLinearConstraints(self):
         return self.__LinearConstraints
-    def FindBoundaryPoints(self, inPeriodicVectors = None):
+    def FindBoundaryPoints(self, inPeriodicVectors = None): #the neighbour count is only redone if the points or the periodic vectors have changed
+        objKey = PeriodicKey(inPeriodicVectors)
+        if self.__blnFoundBoundaryPoints and objKey == self.__BoundaryPeriodicKey:
+            return
         self.__BoundaryPointIndices = gf.GetBoundaryPoints(self.GetRealPoints(), self.GetNumberOfNeighbours(), 1.05*self.GetNearestNeighbourDistance(),inPeriodicVectors)
         lstInteriorPoints = list(set(range(self.GetNumberOfPoints())).difference(list(self.__BoundaryPointIndices)))
         self.__InteriorPointIndices = lstInteriorPoints
+        self.__BoundaryPeriodicKey = objKey
+        self.__blnFoundBoundaryPoints = True
+    def ResetBoundaryPoints(self): #call whenever the real points change
+        self.__blnFoundBoundaryPoints = False
     def GetInteriorPoints(self, inPeriodicVectors = None):
         self.FindBoundaryPoints(inPeriodicVectors)
         return self.__RealPoints[self.__InteriorPointIndices]
@@ -361,11 +373,30 @@ class GeneralLattice(PureLattice,RealCell):
         return rtnArray
        
         
+dctCompiledConstraints = dict() #lambdified constraint strings keyed by (expression, variables) so each is only parsed once
+
+def CompileConstraint(strFunction: str, strVariables = '[x,y,z]'):
+    tupKey = (strFunction, strVariables)
+    if tupKey not in dctCompiledConstraints:
+        lstVariables = parse_expr(strVariables)
+        dctCompiledConstraints[tupKey] = lambdify(lstVariables,parse_expr(strFunction))
+    return dctCompiledConstraints[tupKey]
+
+def EvaluateConstraint(strFunction: str, inPoints: np.array, strVariables = '[x,y,z]')->np.array: #evaluates over all the points in one call
+    arrPoints = np.reshape(np.array(inPoints, dtype='float'), (-1, 3))
+    arrValues = CompileConstraint(strFunction, strVariables)(arrPoints[:,0],arrPoints[:,1],arrPoints[:,2])
+    return np.broadcast_to(arrValues, (len(arrPoints),)) #a constant expression returns a scalar
+
+def PeriodicKey(inPeriodicVectors)->bytes: #hashable form of the periodic vectors used to key the boundary point caches
+    if inPeriodicVectors is None:
+        return None
+    return np.array(inPeriodicVectors, dtype='float').tobytes()
+
 class GeneralGrain(GeneralLattice):
     def __init__(self,inBasisVectors:np.array,inCellNodes: np.array,inLatticeParameters:np.array,inOrigin: np.array,inCellBasis = None):
         self.__AtomType = 1
         self.__VacancyIndices = []
-        self.__InteriorAtomIndices = []
+        self.__AtomIndices = None #cached (periodic key, boundary atom rows, interior atom rows)
         GeneralLattice.__init__(self,inBasisVectors, inCellNodes, inLatticeParameters,inOrigin, inCellBasis)
     def MakeVacancySpace(self, inPoint: np.array, intNumber: int):
         self.__SpatialPoints = KDTree(self.GetAtomPositions())
@@ -398,6 +429,7 @@ class GeneralGrain(GeneralLattice):
     def AddVacancies(self, inList): #pass the row indices of the real points
         self.__VacancyIndices.extend(inList)
         self.__VacancyIndices =list(np.unique(self.__VacancyIndices)) 
+        self.__AtomIndices = None
     def GetNumberOfVacancies(self):
         return len(self.__VacancyIndices)
     def GetVacancies(self):
@@ -406,16 +438,24 @@ class GeneralGrain(GeneralLattice):
         setAll = set(range(self.GetNumberOfPoints()))
         lstRows = list(setAll.difference(self.__VacancyIndices))
         return self.GetRealPoints()[lstRows]
+    def ResetBoundaryPoints(self):
+        GeneralLattice.ResetBoundaryPoints(self)
+        self.__AtomIndices = None
+    def FindAtomIndices(self, inPeriodicVectors=None): #splits the atoms (points which are not vacancies) into boundary and interior rows
+        objKey = PeriodicKey(inPeriodicVectors)
+        if self.__AtomIndices is None or self.__AtomIndices[0] != objKey:
+            setBoundaryPoints = set(self.GetBoundaryIndices(inPeriodicVectors))
+            lstBoundaryRows = list(setBoundaryPoints.difference(self.__VacancyIndices))
+            setAll = set(range(self.GetNumberOfPoints()))
+            setAll = setAll.difference(lstBoundaryRows)
+            lstInteriorRows = list(setAll.difference(self.__VacancyIndices))
+            self.__AtomIndices = (objKey, lstBoundaryRows, lstInteriorRows)
+        return self.__AtomIndices[1], self.__AtomIndices[2]
     def GetInteriorAtomPositions(self,inPeriodicVectors=None):
-        setAll = set(range(self.GetNumberOfPoints()))
-        setAll = setAll.difference(self.GetBoundaryAtomIndices(inPeriodicVectors))
-        lstRows = list(setAll.difference(self.__VacancyIndices))
-        self.__InteriorAtomIndices = lstRows
+        lstRows = self.FindAtomIndices(inPeriodicVectors)[1]
         return self.GetRealPoints()[lstRows]
     def GetNumberOfInteriorAtoms(self,inPeriodicVectors=None):
-        if len(self.__InteriorAtomIndices) ==0:
-            self.GetInteriorAtomPositions(inPeriodicVectors)
-        return len(self.__InteriorAtomIndices)
+        return len(self.FindAtomIndices(inPeriodicVectors)[1])
     def GetNumberOfAtoms(self):
         return self.GetNumberOfPoints()-self.GetNumberOfVacancies()
     def GetAtomType(self)->int:
@@ -426,12 +466,9 @@ class GeneralGrain(GeneralLattice):
         lstRows = self.GetBoundaryAtomIndices(inPeriodicVectors)
         return self.GetRealPoints()[lstRows]
     def GetBoundaryAtomIndices(self, inPeriodicVectors = None):
-        self.FindBoundaryPoints(inPeriodicVectors)
-        setBoundaryPoints = set(self.GetBoundaryIndices(inPeriodicVectors))
-        lstRows = list(setBoundaryPoints.difference(self.__VacancyIndices))
-        return lstRows
+        return self.FindAtomIndices(inPeriodicVectors)[0]
     def GetNumberOfBoundaryAtoms(self, inPeriodicVectors=None):
-        return len(self.GetBoundaryAtoms(inPeriodicVectors))
+        return len(self.FindAtomIndices(inPeriodicVectors)[0])
 
 
 class IrrregularExtrudedGrain(GeneralGrain):
@@ -797,37 +834,9 @@ class SimulationCell(object):
         arrUniqueIndices = np.unique(np.hstack(objGBTree.GetPeriodicIndices(arrIndices)))
         return arrExtendedGBAtoms[arrUniqueIndices]
     def MergeTooCloseAtoms(self,fltDistance:float, intAtomType: int, intLimit = 50):
-        if fltDistance == 0:
-            fltDistance = 1e-5
-        lstGBAtoms = []
-        lstMergedAtoms = []
-        blnStop = False
         arrGBAtoms = self.GetNonGrainAtoms([intAtomType])
-        i = 0
-        while not(blnStop) and i < intLimit:
-            lstMergedAtoms = []
-            objGBTree = gf.PeriodicWrapperKDTree(arrGBAtoms,self.__BasisVectors,self.GetRealConstraints(),fltDistance/2)
-            arrExtendedGBAtoms = objGBTree.GetExtendedPoints()
-            arrIndices,arrDistances = objGBTree.Pquery_radius(arrGBAtoms,fltDistance) #by default points are returned in distance order
-            lstDistances = list(map(lambda x: np.round(x,5),arrDistances))
-            arrLengths = np.array(list(map(lambda x: len(x),arrIndices)))
-            arrRows = np.where(arrLengths > 1)[0]
-            if len(arrRows) > 0:
-                lstIndices = list(map(lambda x: arrIndices[x][lstDistances[x] <= lstDistances[x][1]],arrRows)) #every point 0 distance from itself 
-                #point at position [1] is then the next closest point. 
-                lstUsedIndices = [item for sublist in lstIndices for item in sublist]
-                lstTrueIndices = np.unique(objGBTree.GetPeriodicIndices(lstUsedIndices)).tolist()
-                arrUnusedIndices = np.unique(list(set(range(len(arrGBAtoms))).difference(lstTrueIndices)))
-                lstMergedAtoms = list(map(lambda x: np.mean(arrExtendedGBAtoms[x],axis=0),lstIndices))
-                if len(arrUnusedIndices) > 0:
-                    lstMergedAtoms.append(arrGBAtoms[arrUnusedIndices])
-                arrGBAtoms = np.vstack(lstMergedAtoms)
-                arrGBAtoms = self.RemoveRealDuplicates(arrGBAtoms,1e-3)
-            else:
-                blnStop = True
-            i +=1
-        if i == intLimit:
-            warnings.warn('Merge too close atoms terminated after ' + str(i) + ' iterations')
+        arrGBAtoms = gf.MergeTooCloseAtoms(arrGBAtoms,self.__BasisVectors,fltDistance,intLimit,self.__BoundaryTypes,1e-3)
+        arrGBAtoms = self.WrapVectorIntoSimulationBox(arrGBAtoms)
         self.__NonGrainAtomPositions = arrGBAtoms
         self.__NonGrainAtomTypes = np.ones(len(arrGBAtoms))*intAtomType
     def RemoveRealDuplicates(self, inPoints, fltDistance = 1e-5): #returns the unique points that lie inside the simulation cell
@@ -1077,13 +1086,18 @@ class DefectObject(object):
             self.__TimeStep = []
         self.__dctJunctionLines = dict()
         self.__dctGrainBoundaries = dict()
+        self.__Store = None #DefectStore of an imported .dfz file, defects still set to None are read from it when requested
     def AddJunctionLine(self, objJunctionLine: GeneralJunctionLine):
         self.__dctJunctionLines[objJunctionLine.GetID()] = objJunctionLine 
     def AddGrainBoundary(self, objGrainBoundary: GeneralGrainBoundary):
         self.__dctGrainBoundaries[objGrainBoundary.GetID()] = objGrainBoundary
     def GetJunctionLine(self, intLocalKey: int):
+        if self.__dctJunctionLines[intLocalKey] is None:
+            self.__dctJunctionLines[intLocalKey] = self.__Store.GetJunctionLine(intLocalKey)
         return self.__dctJunctionLines[intLocalKey]
     def GetGrainBoundary(self, intLocalKey):
+        if self.__dctGrainBoundaries[intLocalKey] is None:
+            self.__dctGrainBoundaries[intLocalKey] = self.__Store.GetGrainBoundary(intLocalKey)
         return self.__dctGrainBoundaries[intLocalKey]      
     def GetJunctionLineIDs(self):
         return list(self.__dctJunctionLines.keys())
@@ -1103,7 +1117,16 @@ class DefectObject(object):
         self.__TimeStep = fltTimeStep
     def GetTimeStep(self):
         return self.__TimeStep
-    def ImportData(self, strFilename: str):
+    def ImportData(self, strFilename: str): #reads either a defect store written by WriteDefectStore or the older text format. Only the
+        #header of a store is read here and each junction line or grain boundary is loaded the first time it is requested
+        if zipfile.is_zipfile(strFilename):
+            self.__Store = DefectStore(strFilename)
+            self.__TimeStep = self.__Store.GetTimeStep()
+            for j in self.__Store.GetJunctionLineIDs():
+                self.__dctJunctionLines[j] = None
+            for k in self.__Store.GetGrainBoundaryIDs():
+                self.__dctGrainBoundaries[k] = None
+            return
         with open(strFilename,'r') as fdata:
             blnNotEnd = True
             try:
@@ -1119,36 +1142,36 @@ class DefectObject(object):
                         line = next(fdata).strip()
                         if line == "Mesh Points":
                             line = next(fdata).strip()    
-                            arrMeshPoints = np.array(eval(line))
+                            arrMeshPoints = np.array(ParseListLiteral(line))
                             objJunctionLine = GeneralJunctionLine(arrMeshPoints, intJL)
                             line = next(fdata).strip()
                         if line == "Adjacent Grains":
                             line = next(fdata).strip()    
-                            objJunctionLine.SetAdjacentGrains(eval(line))
+                            objJunctionLine.SetAdjacentGrains(ParseListLiteral(line))
                             line = next(fdata).strip()
                         if line == "Adjacent Grain Boundaries":
                             line = next(fdata).strip()
-                            objJunctionLine.SetAdjacentGrainBoundaries(eval(line))
+                            objJunctionLine.SetAdjacentGrainBoundaries(ParseListLiteral(line))
                             line = next(fdata).strip()
                         if line == "Periodic Directions":
                             line = next(fdata).strip()
-                            objJunctionLine.SetPeriodicDirections(eval(line))
+                            objJunctionLine.SetPeriodicDirections(ParseListLiteral(line))
                             line = next(fdata).strip()
                         if line == "Atom IDs":
                             line = next(fdata).strip()
-                            objJunctionLine.SetAtomIDs(eval(line))
+                            objJunctionLine.SetAtomIDs(ParseListLiteral(line))
                             line = next(fdata).strip()
                         if line == "Volume":
                             line = next(fdata).strip()
-                            objJunctionLine.SetVolume(eval(line))
+                            objJunctionLine.SetVolume(ParseListLiteral(line))
                             line = next(fdata).strip()
                         if line == "PE":
                             line = next(fdata).strip()
-                            objJunctionLine.SetTotalPE(eval(line))
+                            objJunctionLine.SetTotalPE(ParseListLiteral(line))
                             line = next(fdata).strip()
                         if line == "Adjusted Mesh Points":
                             line = next(fdata).strip()
-                            arrAdjustedMeshPoints = np.array(eval(line))
+                            arrAdjustedMeshPoints = np.array(ParseListLiteral(line))
                             objJunctionLine.SetAdjustedMeshPoints(arrAdjustedMeshPoints)
                             line = next(fdata).strip()
                         self.AddJunctionLine(objJunctionLine)       
@@ -1157,36 +1180,36 @@ class DefectObject(object):
                         line = next(fdata).strip()
                         if line == "Mesh Points":
                             line = next(fdata).strip()    
-                            arrMeshPoints = np.array(eval(line))
+                            arrMeshPoints = np.array(ParseListLiteral(line))
                             objGrainBoundary = GeneralGrainBoundary(arrMeshPoints, intGB)
                             line = next(fdata).strip()
                         if line == "Adjacent Grains":
                             line = next(fdata).strip()    
-                            objGrainBoundary.SetAdjacentGrains(eval(line))
+                            objGrainBoundary.SetAdjacentGrains(ParseListLiteral(line))
                             line = next(fdata).strip()
                         if line == "Adjacent Junction Lines":
                             line = next(fdata).strip()
-                            objGrainBoundary.SetAdjacentJunctionLines(eval(line))
+                            objGrainBoundary.SetAdjacentJunctionLines(ParseListLiteral(line))
                             line = next(fdata).strip()
                         if line == "Periodic Directions":
                             line = next(fdata).strip()
-                            objGrainBoundary.SetPeriodicDirections(eval(line))
+                            objGrainBoundary.SetPeriodicDirections(ParseListLiteral(line))
                             line = next(fdata).strip()
                         if line == "Atom IDs":
                             line = next(fdata).strip()
-                            objGrainBoundary.SetAtomIDs(eval(line))
+                            objGrainBoundary.SetAtomIDs(ParseListLiteral(line))
                             line = next(fdata).strip()
                         if line == "Volume":
                             line = next(fdata).strip()
-                            objGrainBoundary.SetVolume(eval(line))
+                            objGrainBoundary.SetVolume(ParseListLiteral(line))
                             line = next(fdata).strip()
                         if line == "PE":
                             line = next(fdata).strip()
-                            objGrainBoundary.SetTotalPE(eval(line))
+                            objGrainBoundary.SetTotalPE(ParseListLiteral(line))
                             line = next(fdata).strip()
                         if line == "Adjusted Mesh Points":
                             line = next(fdata).strip()
-                            arrAdjustedMeshPoints = np.array(eval(line))
+                            arrAdjustedMeshPoints = np.array(ParseListLiteral(line))
                             objGrainBoundary.SetAdjustedMeshPoints(arrAdjustedMeshPoints)
                             line = next(fdata).strip()
                         self.AddGrainBoundary(objGrainBoundary)
@@ -1198,9 +1221,129 @@ class DefectObject(object):
                 if objGrainBoundary is not None:
                     self.AddGrainBoundary(objGrainBoundary) #before the GB or JL objects have been added        
                 blnNotEnd = False
+    def ExportData(self, strFilename: str, blnVolume = False, blnPE = False, blnAdjustedMeshPoints = False): #a .dfz defect store
+        WriteDefectStore(strFilename, self, blnVolume, blnPE, blnAdjustedMeshPoints)
+
+def ParseListLiteral(strLine: str): #values written with '{}'.format(). Numeric lists are read as JSON and anything else as a Python literal, never with eval
+    try:
+        return json.loads(strLine)
+    except ValueError:
+        return ast.literal_eval(strLine)
+
+strDefectStoreExtension = '.dfz' #.dfc files are always the text format
+
+def WriteDefectStore(strFilename: str, objDefects, blnVolume = False, blnPE = False, blnAdjustedMeshPoints = False):
+    #version 1 defect store: an npz file with a JSON header of the scalars and lists of each junction line and grain boundary
+    #and one array per mesh point or atom ID field. objDefects is a DefectObject or any object with the same Get methods, e.g. LAMMPSGlobal.
+    if not(strFilename.endswith(strDefectStoreExtension)):
+        raise Exception("Defect stores are written to " + strDefectStoreExtension + " files not " + strFilename)
+    dctArrays = dict()
+    dctHeader = {'Version': 1, 'TimeStep': objDefects.GetTimeStep(), 'JunctionLines': [], 'GrainBoundaries': []}
+    for strKind, lstIDs, fnGet, strAdjacent in [('JL', objDefects.GetJunctionLineIDs(), objDefects.GetJunctionLine, 'AdjacentGrainBoundaries'), ('GB', objDefects.GetGrainBoundaryIDs(), objDefects.GetGrainBoundary, 'AdjacentJunctionLines')]:
+        for i in lstIDs:
+            objMesh = fnGet(i)
+            strKey = strKind + str(i)
+            dctEntry = {'ID': np.array(i).tolist(), 'Key': strKey, 'AdjacentGrains': np.array(objMesh.GetAdjacentGrains()).tolist(), 'PeriodicDirections': list(objMesh.GetPeriodicDirections())}
+            if strKind == 'JL':
+                dctEntry[strAdjacent] = np.array(objMesh.GetAdjacentGrainBoundaries()).tolist()
+            else:
+                dctEntry[strAdjacent] = np.array(objMesh.GetAdjacentJunctionLines()).tolist()
+            dctArrays[strKey + '_MeshPoints'] = np.array(objMesh.GetMeshPoints())
+            dctArrays[strKey + '_AtomIDs'] = np.array(objMesh.GetAtomIDs())
+            if blnVolume:
+                dctEntry['Volume'] = float(objMesh.GetVolume())
+            if blnPE:
+                dctEntry['PE'] = float(objMesh.GetTotalPE())
+            if blnAdjustedMeshPoints:
+                dctArrays[strKey + '_AdjustedMeshPoints'] = np.array(objMesh.GetAdjustedMeshPoints())
+            if strKind == 'JL':
+                dctHeader['JunctionLines'].append(dctEntry)
+            else:
+                dctHeader['GrainBoundaries'].append(dctEntry)
+    with open(strFilename, 'wb') as fdata: #a file object stops numpy adding .npz to the name
+        np.savez(fdata, Header=json.dumps(dctHeader), **dctArrays)
+
+class DefectStore(object): #reads a file written by WriteDefectStore. Only the header is read on opening and the arrays of a junction
+    #line or grain boundary are read when it is requested. The file is reopened for each request so no handle is held between them.
+    def __init__(self, strFilename: str):
+        self.__FileName = strFilename
+        with np.load(strFilename, allow_pickle=False) as objFile:
+            dctHeader = json.loads(str(objFile['Header']))
+        if dctHeader['Version'] != 1:
+            raise Exception("Unsupported defect store version " + str(dctHeader['Version']))
+        self.__TimeStep = dctHeader['TimeStep']
+        self.__dctJunctionLines = dict(map(lambda x: (x['ID'], x), dctHeader['JunctionLines']))
+        self.__dctGrainBoundaries = dict(map(lambda x: (x['ID'], x), dctHeader['GrainBoundaries']))
+    def GetTimeStep(self):
+        return self.__TimeStep
+    def GetJunctionLineIDs(self):
+        return list(self.__dctJunctionLines.keys())
+    def GetGrainBoundaryIDs(self):
+        return list(self.__dctGrainBoundaries.keys())
+    def __SetFields(self, objMesh, dctEntry: dict, objFile):
+        objMesh.SetAdjacentGrains(dctEntry['AdjacentGrains'])
+        objMesh.SetPeriodicDirections(dctEntry['PeriodicDirections'])
+        objMesh.SetAtomIDs(objFile[dctEntry['Key'] + '_AtomIDs'].tolist())
+        if 'Volume' in dctEntry:
+            objMesh.SetVolume(dctEntry['Volume'])
+        if 'PE' in dctEntry:
+            objMesh.SetTotalPE(dctEntry['PE'])
+        if dctEntry['Key'] + '_AdjustedMeshPoints' in objFile.files:
+            objMesh.SetAdjustedMeshPoints(objFile[dctEntry['Key'] + '_AdjustedMeshPoints'])
+        return objMesh
+    def GetJunctionLine(self, intID: int)->GeneralJunctionLine:
+        dctEntry = self.__dctJunctionLines[intID]
+        with np.load(self.__FileName, allow_pickle=False) as objFile:
+            objJunctionLine = GeneralJunctionLine(objFile[dctEntry['Key'] + '_MeshPoints'], intID)
+            objJunctionLine.SetAdjacentGrainBoundaries(dctEntry['AdjacentGrainBoundaries'])
+            return self.__SetFields(objJunctionLine, dctEntry, objFile)
+    def GetGrainBoundary(self, intID: int)->GeneralGrainBoundary:
+        dctEntry = self.__dctGrainBoundaries[intID]
+        with np.load(self.__FileName, allow_pickle=False) as objFile:
+            objGrainBoundary = GeneralGrainBoundary(objFile[dctEntry['Key'] + '_MeshPoints'], intID)
+            objGrainBoundary.SetAdjacentJunctionLines(dctEntry['AdjacentJunctionLines'])
+            return self.__SetFields(objGrainBoundary, dctEntry, objFile)
+
+strCSLCacheDirectory = os.environ.get('CSL_CACHE_DIRECTORY') #off by default, a shared directory lets a parameter sweep do the crystallography once
+intCSLCacheVersion = 2 #part of every key, increase it whenever the CSL, DSC or triple line algorithms change so old results are not served
+dctCSLCache = dict()
+
+def SetCSLCacheDirectory(strDirectory: str): #None keeps the cache in memory only
+    global strCSLCacheDirectory
+    strCSLCacheDirectory = strDirectory
+
+def CSLCacheKey(strName: str, inAxis: np.array, inCellNodes: np.array, *args)->str:
+    return repr([intCSLCacheVersion, strName, np.array(inAxis).astype('int').tolist(), np.round(np.array(inCellNodes, dtype='float'),10).tolist()] + [np.round(a,10).tolist() if isinstance(a, np.ndarray) else a for a in args])
+
+def ReadCSLCache(strKey: str)->dict:
+    if strKey not in dctCSLCache and strCSLCacheDirectory is not None:
+        strFilename = os.path.join(strCSLCacheDirectory, hashlib.sha1(strKey.encode()).hexdigest() + '.npz')
+        if os.path.isfile(strFilename):
+            try:
+                with np.load(strFilename, allow_pickle=False) as objFile:
+                    if int(objFile['Version']) == 1 and str(objFile['Key']) == strKey: #the full key is stored so a hash collision is never returned
+                        dctCSLCache[strKey] = dict(map(lambda x: (x, objFile[x]), [k for k in objFile.files if k not in ['Version','Key']]))
+            except (OSError, ValueError, KeyError):
+                warnings.warn("Ignoring unreadable CSL cache file " + strFilename)
+    if strKey in dctCSLCache:
+        return dict(map(lambda x: (x[0], np.copy(x[1])), dctCSLCache[strKey].items()))
+    else:
+        return None
+
+def WriteCSLCache(strKey: str, dctValues: dict):
+    dctCSLCache[strKey] = dict(map(lambda x: (x[0], np.array(x[1])), dctValues.items()))
+    if strCSLCacheDirectory is not None:
+        strFilename = os.path.join(strCSLCacheDirectory, hashlib.sha1(strKey.encode()).hexdigest() + '.npz')
+        strTemporary = strFilename[:-4] + '.' + str(os.getpid()) + '.tmp.npz'
+        try:
+            os.makedirs(strCSLCacheDirectory, exist_ok=True)
+            np.savez(strTemporary, Version=1, Key=strKey, **dctCSLCache[strKey])
+            os.replace(strTemporary, strFilename) #concurrent jobs each write their own file and the rename is atomic
+        except OSError:
+            warnings.warn("Unable to write CSL cache file " + strFilename)
 
 class SigmaCell(object):
-    def __init__(self, arrRotationAxis: np.array, inCellNodes: np.array):
+    def __init__(self, arrRotationAxis: np.array, inCellNodes: np.array, blnUseCache = True):
         intGCD = np.gcd.reduce(arrRotationAxis.astype('int'))
         self.__RotationAxis = (arrRotationAxis/intGCD).astype('int')
         self.__CellHeight = np.linalg.norm(self.__RotationAxis)
@@ -1215,13 +1358,65 @@ class SigmaCell(object):
         self.__MedianLattice = []
         self.__OriginalBasis = []
         self.__CurrentSigmaValue = 1
+        self.__PrimitiveVectors = RealCell(inCellNodes, np.ones(3)).GetPrimitiveVectors()
+        self.__DSCPrimitiveVectors = []
+        self.__UseCache = blnUseCache
     def GetCSLPoints(self):
         return self.__CSLPoints
     def GetRotationAxis(self):
         return self.__RotationAxis
     def GetSigmaValues(self, intSigmaMax, blnDisorientation = True):
-        return  gf.CubicCSLGenerator(self.__RotationAxis, intSigmaMax,blnDisorientation)
-    def GetOnlyCSLPrimitiveVectors(self,intSigmaValue,fltPrimitiveCellSize: float):
+        strKey = CSLCacheKey('SigmaValues', self.__RotationAxis, self.__CellType, intSigmaMax, blnDisorientation)
+        if self.__UseCache:
+            dctCache = ReadCSLCache(strKey)
+            if dctCache is not None:
+                return dctCache['SigmaValues']
+        arrSigma = gf.CubicCSLGenerator(self.__RotationAxis, intSigmaMax,blnDisorientation)
+        if self.__UseCache:
+            WriteCSLCache(strKey, {'SigmaValues': arrSigma})
+        return arrSigma
+    def FindSmithNormalPrimitiveVectors(self, inBasis2: np.array, intSigmaValue: int, intMaxDenominator = 50000, intMaxIterations = 1000): #exact CSL and DSC vectors from the Smith normal form of the rotation in primitive co-ordinates
+        #intMaxDenominator: GenericCSLandDSC stops its search at 50000, so reaching it means the rotation had no rational form
+        #intMaxIterations: reduction steps before giving up, an unfinished form then fails IsSmithNormal and the CSL point search is used
+        arrPrimitive = self.__PrimitiveVectors
+        objSmithNormal = sn.GenericCSLandDSC(inBasis2, np.linalg.inv(arrPrimitive))
+        if objSmithNormal.GetRationalDenominator() >= intMaxDenominator:
+            return None, None
+        objSmithNormal.FindSmithNormal(intMaxIterations)
+        if not(objSmithNormal.IsSmithNormal()):
+            return None, None
+        objSmithNormal.GetCSLPrimtiveCell()
+        if int(np.round(objSmithNormal.GetSigma())) != intSigmaValue:
+            return None, None
+        arrCSL = np.matmul(objSmithNormal.GetRightScaling(), np.matmul(objSmithNormal.GetLeftMatrix(), np.matmul(arrPrimitive, inBasis2)))
+        arrDSC = np.matmul(objSmithNormal.GetDSCPrimitiveCell(), arrPrimitive)
+        arrCSLPoints = gf.LatticePointsFromBasis(gf.ReduceLatticeBasis(arrCSL))
+        arrCSLVectors = gf.FindPrimitiveVectors(arrCSLPoints)
+        if np.round(abs(np.linalg.det(arrCSLVectors)) - abs(np.linalg.det(arrCSL)),5) != 0:
+            return None, None
+        arrDSCVectors = gf.FindPrimitiveVectors(gf.LatticePointsFromBasis(gf.ReduceLatticeBasis(arrDSC)))
+        return np.round(arrCSLVectors,10), np.round(arrDSCVectors,10)
+    def __FindCSLPointsPrimitiveVectors(self, inBasis2: np.array, intLength: int):
+        objFirstLattice = ExtrudedRectangle(intLength,intLength,intLength,gf.StandardBasisVectors(3), self.__CellType, np.ones(3),np.zeros(3))
+        objSecondLattice = ExtrudedRectangle(intLength,intLength,intLength,inBasis2,self.__CellType,np.ones(3),np.zeros(3))
+        arrPoints1 = objFirstLattice.GetRealPoints()
+        arrPoints2 = objSecondLattice.GetRealPoints()
+        objTree1 = KDTree(arrPoints1)
+        arrDistancesOne, arrIndicesOne = objTree1.query(arrPoints2, k=1)
+        arrCloseOne = np.where(arrDistancesOne < 1e-5)[0]
+        arrIndicesOne = arrIndicesOne.ravel()
+        arrIndicesOne = arrIndicesOne[arrCloseOne]
+        arrCSLPoints = arrPoints1[arrIndicesOne]
+        return arrCSLPoints, gf.FindPrimitiveVectors(arrCSLPoints)
+    def __FindCSLPointsInCube(self, inCSLVectors: np.array, intLength: int): #the same points as __FindCSLPointsPrimitiveVectors, those in [0,intLength]^3
+        arrCorners = intLength*np.array([[i,j,k] for i in range(2) for j in range(2) for k in range(2)])
+        arrCoefficients = np.matmul(arrCorners, np.linalg.inv(inCSLVectors))
+        lstRanges = list(map(lambda j: np.arange(np.floor(np.min(arrCoefficients[:,j])), np.ceil(np.max(arrCoefficients[:,j]))+1), range(3)))
+        arrPoints = np.matmul(np.stack(np.meshgrid(*lstRanges, indexing='ij'),axis=-1).reshape(-1,3), inCSLVectors)
+        return arrPoints[np.all((arrPoints > -1e-5) & (arrPoints < intLength + 1e-5), axis=1)]
+    def GetDSCPrimitiveVectors(self):
+        return self.__DSCPrimitiveVectors
+    def GetOnlyCSLPrimitiveVectors(self,intSigmaValue,fltPrimitiveCellSize: float, blnSmithNormal = True):
         blnValidSigma = True
         arrSigma = self.GetSigmaValues(300, True)
         arrRows = np.where(arrSigma[:,0].astype('int') == intSigmaValue)[0]
@@ -1229,6 +1424,13 @@ class SigmaCell(object):
         lstAllBases=[]
         if len(arrRows) == 0:
             blnValidSigma = False
+        strKey = CSLCacheKey('CSLPrimitiveVectors', self.__RotationAxis, self.__CellType, intSigmaValue, fltPrimitiveCellSize, blnSmithNormal)
+        if blnValidSigma and self.__UseCache:
+            dctCache = ReadCSLCache(strKey)
+            if dctCache is not None:
+                self.__CurrentSigmaValue = intSigmaValue
+                self.__OriginalBasis = dctCache['Bases'][-1]
+                return list(dctCache['CSLPrimitiveVectors']), list(dctCache['Bases'])
         if blnValidSigma:
             h = self.__CellHeight
             l = np.round(intSigmaValue*fltPrimitiveCellSize,0)
@@ -1238,26 +1440,30 @@ class SigmaCell(object):
                 arrBasis1 = gf.StandardBasisVectors(3)
                 arrBasis2 = gf.RotateVectors(fltSigma,self.__RotationAxis,gf.StandardBasisVectors(3))
                 self.__OriginalBasis = arrBasis2
-                objFirstLattice = ExtrudedRectangle(l,l,l,arrBasis1, self.__CellType, np.ones(3),np.zeros(3))
-                objSecondLattice = ExtrudedRectangle(l,l,l,arrBasis2,self.__CellType,np.ones(3),np.zeros(3))
-                arrPoints1 = objFirstLattice.GetRealPoints()
-                arrPoints2 = objSecondLattice.GetRealPoints()
-                objTree1 = KDTree(arrPoints1)
-                arrDistancesOne, arrIndicesOne = objTree1.query(arrPoints2, k=1)
-                arrCloseOne = np.where(arrDistancesOne < 1e-5)[0]
-                arrIndicesOne = arrIndicesOne.ravel()
-                arrIndicesOne = arrIndicesOne[arrCloseOne]
-                arrCSLPoints = arrPoints1[arrIndicesOne]
-                arrPrimitiveVectors = gf.FindPrimitiveVectors(arrCSLPoints)
+                arrPrimitiveVectors = None
+                if blnSmithNormal:
+                    arrPrimitiveVectors, arrDSCVectors = self.FindSmithNormalPrimitiveVectors(arrBasis2, intSigmaValue)
+                    if arrPrimitiveVectors is None:
+                        warnings.warn("Smith normal form failed for sigma " + str(intSigmaValue) + " using CSL points instead")
+                if arrPrimitiveVectors is None:
+                    arrCSLPoints, arrPrimitiveVectors = self.__FindCSLPointsPrimitiveVectors(arrBasis2, l)
                 lstAllCSLPrimitiveVectors.append(arrPrimitiveVectors)
                 lstAllBases.append(arrBasis2)
+            if self.__UseCache:
+                WriteCSLCache(strKey, {'CSLPrimitiveVectors': lstAllCSLPrimitiveVectors, 'Bases': lstAllBases})
         return lstAllCSLPrimitiveVectors,lstAllBases
-    def MakeCSLCell(self, intSigmaValue: int, blnUnitCell = True):
+    def MakeCSLCell(self, intSigmaValue: int, blnUnitCell = True, blnSmithNormal = True):
         blnValidSigma = True
         arrSigma = self.GetSigmaValues(100, True)
         arrRows = np.where(arrSigma[:,0].astype('int') == intSigmaValue)
         if len(arrRows[0]) == 0:
             blnValidSigma = False
+        strKey = CSLCacheKey('CSLCell', self.__RotationAxis, self.__CellType, intSigmaValue, blnUnitCell, blnSmithNormal)
+        if blnValidSigma and self.__UseCache:
+            dctCache = ReadCSLCache(strKey)
+            if dctCache is not None:
+                self.__SetCSLCellValues(dctCache)
+                return
         if blnValidSigma:
             self.__CurrentSigmaValue = intSigmaValue
             arrSigmas = arrSigma[arrRows]
@@ -1271,18 +1477,17 @@ class SigmaCell(object):
             arrBasis2 = gf.RotateVectors(fltSigma,self.__RotationAxis,gf.StandardBasisVectors(3))
             self.__OriginalBasis = arrBasis2
             arrBasisMedian = gf.RotateVectors(fltSigma/2,self.__RotationAxis,gf.StandardBasisVectors(3))
-            objFirstLattice = ExtrudedRectangle(l,l,l,arrBasis1, self.__CellType, np.ones(3),np.zeros(3))
-            objSecondLattice = ExtrudedRectangle(l,l,l,arrBasis2,self.__CellType,np.ones(3),np.zeros(3))
-            arrPoints1 = objFirstLattice.GetRealPoints()
-            arrPoints2 = objSecondLattice.GetRealPoints()
-            objTree1 = KDTree(arrPoints1)
-            arrDistancesOne, arrIndicesOne = objTree1.query(arrPoints2, k=1)
-            arrCloseOne = np.where(arrDistancesOne < 1e-5)[0]
-            arrIndicesOne = arrIndicesOne.ravel()
-            arrIndicesOne = arrIndicesOne[arrCloseOne]
-            arrCSLPoints = arrPoints1[arrIndicesOne]
-            self.__CSLPoints = arrCSLPoints
-            arrPrimitiveVectors = gf.FindPrimitiveVectors(arrCSLPoints)
+            arrPrimitiveVectors = None
+            if blnSmithNormal:
+                arrPrimitiveVectors, arrDSCVectors = self.FindSmithNormalPrimitiveVectors(arrBasis2, intSigmaValue)
+                if arrPrimitiveVectors is None:
+                    warnings.warn("Smith normal form failed for sigma " + str(intSigmaValue) + " using CSL points instead")
+                else:
+                    self.__DSCPrimitiveVectors = arrDSCVectors
+                    self.__CSLPoints = self.__FindCSLPointsInCube(arrPrimitiveVectors, l)
+            if arrPrimitiveVectors is None:
+                arrCSLPoints, arrPrimitiveVectors = self.__FindCSLPointsPrimitiveVectors(arrBasis2, l)
+                self.__CSLPoints = arrCSLPoints
             self.__CSLPrimitiveVectors = arrPrimitiveVectors
             self.__CSLPrimitiveInverse = np.linalg.inv(arrPrimitiveVectors)    
             if blnUnitCell:
@@ -1299,8 +1504,37 @@ class SigmaCell(object):
             lstLatticeBasis.append(np.matmul(arrBasis2,arrTransformation))
             self.__LatticeBases = lstLatticeBasis 
             self.__MedianLattice = np.matmul(arrBasisMedian,arrTransformation)   
+            if self.__UseCache:
+                WriteCSLCache(strKey, self.__GetCSLCellValues())
         else:
             warnings.warn("Invalid sigma value for axis " + str(self.__RotationAxis))
+    def __GetCSLCellValues(self)->dict:
+        dctValues = dict()
+        dctValues['CurrentSigmaValue'] = self.__CurrentSigmaValue
+        dctValues['LatticeRotation'] = self.__LatticeRotation
+        dctValues['OriginalBasis'] = self.__OriginalBasis
+        dctValues['CSLPoints'] = self.__CSLPoints
+        dctValues['CSLPrimitiveVectors'] = self.__CSLPrimitiveVectors
+        dctValues['CSLPrimitiveInverse'] = self.__CSLPrimitiveInverse
+        dctValues['DSCPrimitiveVectors'] = self.__DSCPrimitiveVectors
+        dctValues['BasisVectors'] = self.__BasisVectors
+        dctValues['TransformationMatrix'] = self.__TransformationMatrix
+        dctValues['LatticeBases'] = self.__LatticeBases
+        dctValues['MedianLattice'] = self.__MedianLattice
+        return dctValues
+    def __SetCSLCellValues(self, dctValues: dict):
+        self.__CurrentSigmaValue = int(dctValues['CurrentSigmaValue'])
+        self.__LatticeRotation = float(dctValues['LatticeRotation'])
+        self.__OriginalBasis = dctValues['OriginalBasis']
+        self.__CSLPoints = dctValues['CSLPoints']
+        self.__CSLPrimitiveVectors = dctValues['CSLPrimitiveVectors']
+        self.__CSLPrimitiveInverse = dctValues['CSLPrimitiveInverse']
+        if len(dctValues['DSCPrimitiveVectors']) > 0:
+            self.__DSCPrimitiveVectors = dctValues['DSCPrimitiveVectors']
+        self.__BasisVectors = dctValues['BasisVectors']
+        self.__TransformationMatrix = dctValues['TransformationMatrix']
+        self.__LatticeBases = list(dctValues['LatticeBases'])
+        self.__MedianLattice = dctValues['MedianLattice']
     def GetCurrentSigmaValue(self):
         return self.__CurrentSigmaValue
     def GetPossibleSigmaFactors(self): 
@@ -1333,7 +1567,7 @@ class SigmaCell(object):
         return blnIsCSL
 
 class CSLTripleLine(object):
-    def __init__(self,arrRotationAxis: np.array, inCellNodes: np.array) -> None:
+    def __init__(self,arrRotationAxis: np.array, inCellNodes: np.array, blnUseCache = True) -> None:
         intGCD = np.gcd.reduce(arrRotationAxis)
         self.__RotationAxis = (arrRotationAxis/intGCD).astype('int')
         if np.all(self.__RotationAxis == np.array([0,0,1])):
@@ -1350,29 +1584,49 @@ class CSLTripleLine(object):
         self.__CurrentTJSigmaValue = []
         self.__OriginalBases = []
         self.__DSCBasisVectors = []
+        self.__UseCache = blnUseCache
     def FindTripleLineSigmaValues(self,  intSigmaMax: int, intIterations = 50):
+        strKey = CSLCacheKey('TripleLineSigmaValues', self.__RotationAxis, self.__CellType, intSigmaMax, intIterations)
+        if self.__UseCache:
+            dctCache = ReadCSLCache(strKey)
+            if dctCache is not None:
+                self.__TJSigmaValues = dctCache['TJSigmaValues']
+                self.__TripleValues = dctCache['TripleValues']
+                self.__RotationAngles = np.zeros(len(self.__TripleValues))
+                return np.copy(self.__TripleValues)
         arrSigma = gf.CubicCSLGenerator(self.__RotationAxis,intIterations)
         arrSigmaValues = arrSigma[:,0].astype('int')
         arrRows = np.where(arrSigmaValues <= intSigmaMax)
         intLength = np.max(arrRows)
-        lstIndices = []
-        for i in range(intLength):
-            for j in range(i,intLength):
-                for k in range(j,intLength):
-                    fltAngle = arrSigma[i,1]+arrSigma[j,1]+arrSigma[k,1] -2*np.pi
-                    if abs(fltAngle) < 1e-5:
-                        if sorted([i,j,k]) not in lstIndices:
-                            lstIndices.append(sorted([i,j,k]))      
-        arrTripleValues = arrSigma[np.array(lstIndices)]
-        arrTJSigmaValues = np.zeros([len(arrTripleValues)])
-        n = 0
-        for a in arrTripleValues:
-            arrTJSigmaValues[n] = self.GetTJSigmaValue(a)
-            n += 1
+        arrIndices = self.FindAngleTriples(arrSigma[:intLength,1], 2*np.pi, 1e-5)
+        arrTripleValues = arrSigma[arrIndices]
+        arrTJSigmaValues = np.sqrt(np.prod(arrTripleValues[:,:,0],axis=1))
         self.__TJSigmaValues = arrTJSigmaValues
         self.__TripleValues = arrTripleValues
         self.__RotationAngles = np.zeros(len(arrTripleValues))
+        if self.__UseCache:
+            WriteCSLCache(strKey, {'TJSigmaValues': arrTJSigmaValues, 'TripleValues': arrTripleValues})
         return arrTripleValues
+    def FindAngleTriples(self, inAngles: np.array, fltTarget: float, fltTolerance: float)->np.array: #all i <= j <= k with the three angles summing to fltTarget, in lexicographic order
+        arrOrder = np.argsort(inAngles, kind='stable')
+        arrSorted = inAngles[arrOrder]
+        lstIndices = []
+        for i in range(len(inAngles)):
+            arrJ = np.arange(i, len(inAngles))
+            arrRemainder = fltTarget - inAngles[i] - inAngles[arrJ]
+            arrStart = np.searchsorted(arrSorted, arrRemainder - 2*fltTolerance, side='left') #the window is widened and each candidate is checked with the direct sum below
+            arrCounts = np.searchsorted(arrSorted, arrRemainder + 2*fltTolerance, side='right') - arrStart
+            if np.sum(arrCounts) > 0:
+                arrPairJ = np.repeat(arrJ, arrCounts)
+                arrOffsets = np.arange(np.sum(arrCounts)) - np.repeat(np.cumsum(arrCounts) - arrCounts, arrCounts)
+                arrK = arrOrder[np.repeat(arrStart, arrCounts) + arrOffsets]
+                arrKeep = (arrK >= arrPairJ) & (np.abs(inAngles[i] + inAngles[arrPairJ] + inAngles[arrK] - fltTarget) < fltTolerance)
+                if np.any(arrKeep):
+                    lstIndices.append(np.stack([np.full(np.sum(arrKeep), i), arrPairJ[arrKeep], arrK[arrKeep]],axis=1))
+        if len(lstIndices) == 0:
+            return np.zeros([0,3]).astype('int')
+        arrIndices = np.concatenate(lstIndices, axis=0)
+        return arrIndices[np.lexsort((arrIndices[:,2], arrIndices[:,1], arrIndices[:,0]))]
     def GetTripleLineSigmaValues(self):
         return self.__TJSigmaValues
     def GetTripleLineValues(self):
@@ -1384,7 +1638,7 @@ class CSLTripleLine(object):
         intGCD = np.gcd.reduce(np.gcd.reduce(arrProduct))
     def GetTJSigmaValue(self, arrSigmaArray: np.array):
         #intSigma = np.sqrt(arrSigmaArray[2,0]**2*intGCD)
-        intSigma = np.sqrt(np.product(arrSigmaArray[:,0]))
+        intSigma = np.sqrt(np.prod(arrSigmaArray[:,0]))
         return intSigma
     def FindCoincidentLattice(self, lstThreeBases: list, fltL: float):
         objFirstLattice = ExtrudedRectangle(fltL,fltL,fltL,lstThreeBases[0], self.__CellType, np.ones(3),np.zeros(3))
@@ -1407,6 +1661,18 @@ class CSLTripleLine(object):
         return arrPrimitiveVectors
     def GetTJBasisVectors(self, intTJSigmaValueIndex: int, blnUnitCell = True):
         arrTripleValues = self.__TripleValues[intTJSigmaValueIndex]
+        strKey = CSLCacheKey('TJBasisVectors', self.__RotationAxis, self.__CellType, arrTripleValues, blnUnitCell)
+        if self.__UseCache:
+            dctCache = ReadCSLCache(strKey)
+            if dctCache is not None:
+                self.__CurrentTJSigmaValue = float(dctCache['CurrentTJSigmaValue'])
+                self.__OriginalBases = list(dctCache['OriginalBases'])
+                self.__CSLPrimitiveVectors = dctCache['CSLPrimitiveVectors']
+                self.__CSLBasisVectors = dctCache['CSLBasisVectors']
+                self.__SimulationCellBasis = dctCache['SimulationCellBasis']
+                self.__RotationMatrix = dctCache['RotationMatrix']
+                self.__LatticeBases = list(dctCache['LatticeBases'])
+                return np.copy(self.__CSLBasisVectors)
         arrBasisVectors = gf.StandardBasisVectors(3)
         l = self.__TJSigmaValues[intTJSigmaValueIndex]
         self.__CurrentTJSigmaValue = l
@@ -1433,6 +1699,16 @@ class CSLTripleLine(object):
         lstLatticeBasis.append(np.matmul(arrBasis2,arrTransformationMatrix))
         lstLatticeBasis.append(np.matmul(arrBasis3,arrTransformationMatrix))
         self.__LatticeBases = lstLatticeBasis
+        if self.__UseCache:
+            dctValues = dict()
+            dctValues['CurrentTJSigmaValue'] = l
+            dctValues['OriginalBases'] = lstOriginalBases
+            dctValues['CSLPrimitiveVectors'] = arrPrimitiveVectors
+            dctValues['CSLBasisVectors'] = arrReturn
+            dctValues['SimulationCellBasis'] = self.__SimulationCellBasis
+            dctValues['RotationMatrix'] = arrTransformationMatrix
+            dctValues['LatticeBases'] = lstLatticeBasis
+            WriteCSLCache(strKey, dctValues)
         return arrReturn
     def GetOriginalBasis(self, intBasis):
         return self.__OriginalBases[intBasis]
@@ -10,6 +10,8 @@ import itertools as it
 from numpy.linalg.linalg import det
 import scipy as sc
 from scipy import spatial
+from scipy import sparse
+from scipy.sparse import csgraph
 import sympy as sy
 from sklearn.cluster import DBSCAN
 from sklearn.neighbors import KDTree
@@ -162,6 +164,13 @@ def FCCQuaternionEquivalence(inVector: np.array)->np.array:
         + arrVector[0,1],arrVector[0,0]+arrVector[0,1]+arrVector[0,2]+arrVector[0,3]])*1/2
         intMax = np.argmax(arrVector[:,0])
         return arrVector[intMax]       
+def FCCQuaternionEquivalences(inVectors: np.array)->np.array: #FCCQuaternionEquivalence applied to each row
+        arrSorted = np.sort(np.abs(inVectors),axis=1)
+        q0,q1,q2,q3 = arrSorted.T
+        arrVectors = np.stack([arrSorted, np.column_stack([q0-q1,q1+q0,q2-q3,q3+q2])/np.sqrt(2),
+        np.column_stack([q0-q3-q1+q2,q1-q3-q2+q0,q2-q3-q0+q1,q0+q1+q2+q3])/2],axis=1)
+        arrMax = np.argmax(arrVectors[:,:,0],axis=1)
+        return arrVectors[np.arange(len(arrVectors)),arrMax]
 def EquidistantPoint(inVector1: np.array, inVector2: np.array, inVector3: np.array)->np.array: #3 dimensions only
         arrMatrix = np.zeros([3,3])
         arrMatrix[0] = inVector3-inVector2
@@ -311,18 +320,45 @@ def PeriodicMinDisplacement(arrDisplacements, inPeriodicVectors: np.array, inPer
        arrMinColumns = np.argmin(arrStackedDistances, axis =0)
        arrMinPoints = intLength*arrMinColumns + arrRows
        return arrPoints[arrMinPoints], arrDistances[arrMinPoints]
-def PeriodicShiftAllCloser(inFixedPoint: np.array, inAllPointsToShift: np.array, inCellVectors:np.array, inBasisConversion: np.array, inBoundaryList: list, blnNearyBy = False)->np.array:
-        arrPoints = np.array(list(map(lambda x: PeriodicShiftCloser(inFixedPoint, x, inCellVectors, inBasisConversion, inBoundaryList, blnNearyBy), inAllPointsToShift)))
-        return arrPoints
+def PeriodicShiftAllCloser(inFixedPoint: np.array, inAllPointsToShift: np.array, inCellVectors:np.array, inBasisConversion: np.array, inBoundaryList: list, blnNearyBy = False, intChunkSize = 100000)->np.array:
+        #vectorised PeriodicShiftCloser for all the points at once
+        arrPointsToShift = np.array(inAllPointsToShift, dtype='float')
+        if len(arrPointsToShift) == 0:
+                return np.array([])
+        lstReturn = []
+        for i in range(0, len(arrPointsToShift), intChunkSize):
+                arrCandidates = PeriodicEquivalentsAll(arrPointsToShift[i:i+intChunkSize], inCellVectors, inBasisConversion, inBoundaryList, blnNearyBy)
+                arrDistances = np.linalg.norm(arrCandidates - inFixedPoint, axis=2)
+                lstReturn.append(arrCandidates[np.arange(len(arrCandidates)), np.argmin(arrDistances, axis=1)])
+        return np.concatenate(lstReturn)
+def PeriodicEquivalentsAll(inPoints: np.array, inCellVectors: np.array, inBasisConversion: np.array, inBoundaryList: list, blnInsideCell = False)->np.array:
+        #PeriodicEquivalents for an array of points returned with shape (points, equivalents, dimensions). The equivalents 
+        #are built in the same order and with the same additions so the results agree exactly.
+        arrVectors = np.array(inPoints, dtype='float')[:,np.newaxis,:]
+        arrCoefficients = np.matmul(inPoints, inBasisConversion)
+        for i,strBoundary in enumerate(inBoundaryList):
+                if strBoundary == 'pp':
+                        if blnInsideCell:
+                                arrMove = np.where(arrCoefficients[:,i:i+1] > 0.5, -inCellVectors[i], inCellVectors[i])
+                                arrVectors = np.concatenate([arrVectors, arrVectors + arrMove[:,np.newaxis,:]], axis=1)
+                        else:
+                                arrVectors = np.concatenate([arrVectors, arrVectors + inCellVectors[i], arrVectors - inCellVectors[i]], axis=1)
+        return arrVectors
 def PeriodicShiftCloser(inFixedPoint: np.array, inPointToShift: np.array, inCellVectors:np.array, inBasisConversion: np.array, inBoundaryList: list, blnNearyBy=False)->np.array:
         arrPeriodicVectors = PeriodicEquivalents(inPointToShift, inCellVectors, inBasisConversion, inBoundaryList, blnNearyBy)
         fltDistances = list(map(np.linalg.norm, np.subtract(arrPeriodicVectors, inFixedPoint)))
         return arrPeriodicVectors[np.argmin(fltDistances)]
-def MakePeriodicDistanceMatrix(inVectors1: np.array, inVectors2: np.array, inCellVectors: np.array, inBasisConversion: np.array, inBoundaryList: list)->np.array:
-        arrPeriodicDistance = np.zeros([len(inVectors1), len(inVectors2)])
-        for j in range(len(inVectors1)):
-            for k in range(len(inVectors2)):
-                arrPeriodicDistance[j,k] = PeriodicMinimumDistance(inVectors1[j],inVectors2[k], inCellVectors, inBasisConversion, inBoundaryList)
+def MakePeriodicDistanceMatrix(inVectors1: np.array, inVectors2: np.array, inCellVectors: np.array, inBasisConversion: np.array, inBoundaryList: list, intChunkSize = 10**6)->np.array:
+        arrVectors1 = np.array(inVectors1, dtype='float')
+        arrVectors2 = np.array(inVectors2, dtype='float')
+        arrPeriodicDistance = np.zeros([len(arrVectors1), len(arrVectors2)])
+        if len(arrVectors1) == 0 or len(arrVectors2) == 0:
+                return arrPeriodicDistance
+        arrCandidates = PeriodicEquivalentsAll(arrVectors2, inCellVectors, inBasisConversion, inBoundaryList)
+        intRows = max(1, intChunkSize//np.size(arrCandidates)) #bounds the size of the rows x columns x equivalents array
+        for j in range(0, len(arrVectors1), intRows):
+                arrDifferences = arrCandidates[np.newaxis,:,:,:] - arrVectors1[j:j+intRows,np.newaxis,np.newaxis,:]
+                arrPeriodicDistance[j:j+intRows] = np.min(np.linalg.norm(arrDifferences, axis=3), axis=2)
         return arrPeriodicDistance
 def AddPeriodicWrapper(inPoints: np.array,inCellVectors: np.array, fltDistance: float, blnRemoveOriginalPoints = False, lstPeriodic = ['p','p','p']):
         arrInverseMatrix = np.linalg.inv(inCellVectors)
@@ -426,6 +462,19 @@ def PeriodicEquivalentMovement(inVector1, inVector2,inCellVectors, inBasisConver
         intMin = np.argmin(arrDistances)
         arrIntegerMove = arrIntegers + (arrDecimals[intMin] - arrOriginalDecimals) #returns real distance, shortest vector, periodic part of movement
         return arrDistances[intMin], np.matmul(arrIntegers + arrDecimals[intMin], inCellVectors), np.matmul(arrIntegerMove, inCellVectors)
+def PeriodicEquivalentMovements(inVectors1, inVectors2, inCellVectors, inBasisConversion, inBoundaryList): #PeriodicEquivalentMovement
+        #for each row pair of inVectors1 and inVectors2 at once. Returns arrays of the distances, shortest vectors and periodic parts of the movements.
+        arrCoefficients = np.matmul(np.reshape(inVectors2,(-1,len(inCellVectors))) - np.reshape(inVectors1,(-1,len(inCellVectors))),inBasisConversion)
+        arrIntegers = np.round(arrCoefficients,0)
+        arrDecimals = arrCoefficients - arrIntegers
+        lstSteps = list(map(lambda x: [0,-1,1] if x == 'pp' else [0], inBoundaryList))
+        arrChanges = np.array(list(it.product(*lstSteps)),dtype='float')
+        arrCandidates = arrDecimals[:,np.newaxis,:] + arrChanges[np.newaxis,:,:]
+        arrSquared = np.sum(np.matmul(arrCandidates, np.transpose(inCellVectors))**2, axis=2) #the same metric as InnerProduct
+        arrMin = np.argmin(arrSquared, axis=1)
+        arrRows = np.arange(len(arrCoefficients))
+        arrIntegerMoves = arrIntegers + arrChanges[arrMin]
+        return np.sqrt(arrSquared[arrRows,arrMin]), np.matmul(arrIntegers + arrCandidates[arrRows,arrMin], inCellVectors), np.matmul(arrIntegerMoves, inCellVectors)
 def PowerRule(r, a,b):
         return b*r**a
 def LinearRule(r,m,c):
@@ -726,7 +775,7 @@ def CubicQuaternions():
                                 fltLength = np.round(np.linalg.norm(arrDirection),5)
                                 if  fltLength == 1:
                                         for a in range(0,4):
-                                                lstQuaternions.append(GetQuaternionFromVector(arrDirection,np.pi/4*a))
+                                                lstQuaternions.append(GetQuaternionFromVector(arrDirection,np.pi/2*a))
                                 elif fltLength == np.round(np.sqrt(2),5):
                                         lstQuaternions.append(GetQuaternionFromVector(arrDirection,np.pi))
                                 elif fltLength ==np.round(np.sqrt(3),5):
@@ -735,44 +784,125 @@ def CubicQuaternions():
         arrValues = np.vstack(lstQuaternions)
         arrRows = np.unique(np.round(arrValues,3),axis=0, return_index=True)[1]                              
         return arrValues[arrRows]
+def HexagonalQuaternions(): #proper rotations of 6/mmm with the c axis along z
+        lstQuaternions = []
+        for a in range(6):
+                lstQuaternions.append(GetQuaternionFromVector(np.array([0,0,1]),np.pi/3*a))
+                lstQuaternions.append(GetQuaternionFromVector(np.array([np.cos(np.pi/6*a),np.sin(np.pi/6*a),0]),np.pi))
+        return np.vstack(lstQuaternions)
+def SymmetryQuaternions(strSymmetry: str):
+        if strSymmetry == 'cubic':
+                arrValues = CubicQuaternions()
+        elif strSymmetry == 'hcp':
+                arrValues = HexagonalQuaternions()
+        else:
+                raise ValueError('Unknown symmetry ' + str(strSymmetry))
+        arrFirst = np.argmax(np.abs(arrValues) > 1e-5, axis=1)
+        arrValues = arrValues*np.sign(arrValues[np.arange(len(arrValues)),arrFirst])[:,np.newaxis] #q and -q are the same rotation
+        arrRows = np.unique(np.round(arrValues,5),axis=0, return_index=True)[1]
+        return arrValues[np.sort(arrRows)]
+def QuaternionProducts(inQuaternions1: np.array, inQuaternions2: np.array)->np.array: #row by row products, a single quaternion broadcasts
+        r1 = inQuaternions1[...,0]
+        v1 = inQuaternions1[...,1:]
+        r2 = inQuaternions2[...,0]
+        v2 = inQuaternions2[...,1:]
+        arrR = r1*r2 - np.sum(v1*v2,axis=-1)
+        arrV = r1[...,np.newaxis]*v2 + r2[...,np.newaxis]*v1 + np.cross(v1,v2)
+        return np.concatenate([arrR[...,np.newaxis], arrV],axis=-1)
+def QuaternionDisorientations(inQuaternions: np.array, inReference: np.array, strSymmetry = 'cubic', intChunkSize = 100000)->np.array: #minimum angle over the symmetry operators for each row of inQuaternions
+        arrEquivalents = QuaternionProducts(inReference, SymmetryQuaternions(strSymmetry))
+        arrMaxDot = np.zeros(len(inQuaternions))
+        for i in range(0, len(inQuaternions), intChunkSize): #chunks bound the N x operators matrix
+                arrMaxDot[i:i+intChunkSize] = np.max(np.abs(np.matmul(inQuaternions[i:i+intChunkSize], arrEquivalents.T)), axis=1)
+        return 2*np.arccos(np.minimum(arrMaxDot, 1))
+def PairDisorientations(inQuaternions1: np.array, inQuaternions2: np.array, strSymmetry = 'cubic', intChunkSize = 100000)->np.array: #row by row minimum angle over the symmetry operators
+        arrSymmetries = SymmetryQuaternions(strSymmetry)
+        arrConjugates = inQuaternions1*np.array([1,-1,-1,-1])
+        arrMaxDot = np.zeros(len(inQuaternions1))
+        for i in range(0, len(inQuaternions1), intChunkSize): #|q2.(q1 s)| = |(q1* q2).s| so the operators are applied to the relative rotation
+                arrRelative = QuaternionProducts(arrConjugates[i:i+intChunkSize], inQuaternions2[i:i+intChunkSize])
+                arrMaxDot[i:i+intChunkSize] = np.max(np.abs(np.matmul(arrRelative, arrSymmetries.T)), axis=1)
+        return 2*np.arccos(np.minimum(arrMaxDot, 1))
 
-def MergeTooCloseAtoms(inPoints, inBasisVectors, fltDistance, intLimit =50):
+def MergeTooCloseAtoms(inPoints, inBasisVectors, fltDistance, intLimit =50, lstBoundaryType = ['p','p','p'], fltDuplicateDistance = None):
+        #each pass replaces every point which has a neighbour within fltDistance by the mean of itself and its nearest neighbours (all those tied at
+        #the nearest distance), then removes points within fltDuplicateDistance of a lower row, which defaults to fltDistance. Passes repeat until
+        #no pairs are found. One cell list of the merged points per pass gives both the duplicates and the pairs for the next pass.
         if fltDistance == 0:
                 fltDistance = 1e-5
+        if fltDuplicateDistance is None:
+                fltDuplicateDistance = fltDistance
+        fltCutoff = max(fltDistance, fltDuplicateDistance)
+        arrPeriodic = np.array(list(map(lambda x: x == 'p', lstBoundaryType)))
+        arrWidths = 1/np.linalg.norm(np.linalg.inv(inBasisVectors), axis=0) #perpendicular widths of the cell
+        if np.any(arrWidths[arrPeriodic] <= 2*fltCutoff):
+                raise ValueError('Merge distance ' + str(fltCutoff) + ' must be less than half the smallest periodic cell width ' + str(np.min(arrWidths[arrPeriodic])) + ' for minimum image pairs')
         blnStop = False
         i = 0
         arrPoints = np.copy(inPoints)
-        inConstraints = FindConstraintsFromBasisVectors(inBasisVectors)
+        arrPairs, arrDistances = np.zeros([0,2],dtype='int'), np.zeros(0)
+        if len(arrPoints) > 1:
+                arrPairs, arrDistances = CellList(arrPoints, inBasisVectors, fltCutoff, lstBoundaryType).Pquery_pairs()
         while not(blnStop) and i < intLimit:
-                lstMergedAtoms = []
-                objGBTree = PeriodicWrapperKDTree(arrPoints,inBasisVectors,inConstraints,1.05*fltDistance/2)
-                arrExtendedGBAtoms = objGBTree.GetExtendedPoints()
-                arrIndices,arrDistances = objGBTree.Pquery_radius(arrPoints,fltDistance) #by default points are returned in distance order
-                lstDistances = list(map(lambda x: np.round(x,5),arrDistances))
-                arrLengths = np.array(list(map(lambda x: len(x),arrIndices)))
-                arrRows = np.where(arrLengths > 1)[0]
-                if len(arrRows) > 0:
-                        lstIndices = list(map(lambda x: arrIndices[x][lstDistances[x] <= lstDistances[x][1]],arrRows)) #every point 0 distance from itself 
-                        #point at position [1] is then the next closest point. 
-                        lstUsedIndices = [item for sublist in lstIndices for item in sublist]
-                        lstTrueIndices = np.unique(objGBTree.GetPeriodicIndices(lstUsedIndices)).tolist()
-                        arrUnusedIndices = np.unique(list(set(range(len(arrPoints))).difference(lstTrueIndices)))
-                        lstMergedAtoms = list(map(lambda x: np.mean(arrExtendedGBAtoms[x],axis=0),lstIndices))
-                        if len(arrUnusedIndices) > 0:
-                                lstMergedAtoms.append(arrPoints[arrUnusedIndices])
-                        arrPoints = np.vstack(lstMergedAtoms)
-                        arrRows = FindDuplicates(arrPoints, inBasisVectors,fltDistance) 
-                        lstUniqueIndices = list(set(range(len(arrPoints))).difference(arrRows.tolist()))
-                        arrUniqueIndices = np.unique(lstUniqueIndices)
-                        arrPoints = arrPoints[arrUniqueIndices]
-
+                arrPairs = arrPairs[arrDistances <= fltDistance]
+                if len(arrPairs) > 0:
+                        arrPoints = MergeNearestNeighbours(arrPoints, inBasisVectors, arrPairs, lstBoundaryType)
+                        arrPairs, arrDistances = CellList(arrPoints, inBasisVectors, fltCutoff, lstBoundaryType).Pquery_pairs()
+                        arrKeep = np.ones(len(arrPoints), dtype='bool')
+                        arrKeep[arrPairs[arrDistances <= fltDuplicateDistance,1]] = False #pairs are i < j so every point keeps its lowest neighbour
+                        arrRows = np.where(np.all(arrKeep[arrPairs], axis=1))[0]
+                        arrPairs, arrDistances = (np.cumsum(arrKeep) - 1)[arrPairs[arrRows]], arrDistances[arrRows] #pairs of the remaining points
+                        arrPoints = arrPoints[arrKeep]
                 else:
                         blnStop = True
                 i +=1
-        if i == intLimit:
+        if i == intLimit and not(blnStop):
                 warnings.warn('Merge too close atoms terminated after ' + str(i) + ' iterations')
-        
         return arrPoints
+def MergeNearestNeighbours(inPoints, inCellVectors, inPairs, lstBoundaryType = ['p','p','p']): #one pass of MergeTooCloseAtoms. Points in inPairs are
+        #replaced by the minimum image mean of themselves and their nearest neighbours in inPairs and come first, followed by the unpaired points.
+        intLength = len(inPoints)
+        arrPairs = np.unique(np.reshape(np.array(inPairs,dtype='int'),(-1,2)), axis=0)
+        arrFractional = np.matmul(inPoints[arrPairs[:,1]] - inPoints[arrPairs[:,0]], np.linalg.inv(inCellVectors))
+        arrPeriodic = np.array(list(map(lambda x: x == 'p', lstBoundaryType)))
+        arrFractional[:,arrPeriodic] -= np.round(arrFractional[:,arrPeriodic])
+        arrVectors = np.matmul(arrFractional, inCellVectors)
+        arrRows = np.append(arrPairs[:,0], arrPairs[:,1])
+        arrVectors = np.append(arrVectors, -arrVectors, axis=0)
+        arrDistances = np.round(np.linalg.norm(arrVectors, axis=1),5)
+        arrNearest = np.full(intLength, np.inf)
+        np.minimum.at(arrNearest, arrRows, arrDistances)
+        arrUsed = arrDistances <= arrNearest[arrRows] #ties at the nearest distance are all included
+        arrSums = np.zeros(np.shape(inPoints))
+        np.add.at(arrSums, arrRows[arrUsed], arrVectors[arrUsed])
+        arrCounts = np.bincount(arrRows[arrUsed], minlength=intLength)
+        arrMerged = np.where(arrCounts > 0)[0]
+        arrUnused = np.where(arrCounts == 0)[0]
+        arrMeans = inPoints[arrMerged] + arrSums[arrMerged]/(arrCounts[arrMerged][:,np.newaxis] + 1)
+        return np.append(arrMeans, inPoints[arrUnused], axis=0)
+def PairLabels(inPairs: np.array, intLength: int, intMinSamples = 1)->np.array: #DBSCAN labels from the edges of a radius graph
+        #a point is a core point if it has at least intMinSamples neighbours counting itself. Core points are joined into connected components
+        #numbered by their first core point, other points take the lowest label among their core neighbours and are -1 if they have none.
+        arrPairs = np.reshape(np.array(inPairs,dtype='int'),(-1,2))
+        arrPairs = np.unique(np.sort(arrPairs[arrPairs[:,0] != arrPairs[:,1]],axis=1),axis=0) #a small periodic cell can give the same pair through several images
+        arrCore = np.bincount(arrPairs.ravel(), minlength=intLength) + 1 >= intMinSamples
+        arrCorePairs = arrPairs[arrCore[arrPairs[:,0]] & arrCore[arrPairs[:,1]]]
+        objGraph = sparse.coo_matrix((np.ones(len(arrCorePairs)),(arrCorePairs[:,0],arrCorePairs[:,1])),shape=(intLength,intLength))
+        arrComponents = csgraph.connected_components(objGraph, directed=False)[1]
+        arrUnique, arrFirst = np.unique(arrComponents[arrCore], return_index=True)
+        arrLookUp = np.zeros(len(arrComponents), dtype='int')
+        arrLookUp[arrUnique[np.argsort(arrFirst)]] = np.arange(len(arrUnique))
+        arrLabels = np.full(intLength, intLength)
+        arrLabels[arrCore] = arrLookUp[arrComponents[arrCore]]
+        for i, j in [(0,1),(1,0)]:
+                arrRows = arrCore[arrPairs[:,j]] & ~arrCore[arrPairs[:,i]]
+                np.minimum.at(arrLabels, arrPairs[arrRows,i], arrLabels[arrPairs[arrRows,j]])
+        arrLabels[arrLabels == intLength] = -1
+        return arrLabels
+def PeriodicRadiusLabels(inPoints: np.array, inCellVectors: np.array, fltRadius: float, lstBoundaryType = ['p','p','p'], intMinSamples = 5)->np.array:
+        #DBSCAN(eps=fltRadius, min_samples=intMinSamples) with minimum image distances so clusters continue across periodic boundaries
+        arrPairs = CellList(inPoints, inCellVectors, fltRadius, lstBoundaryType).Pquery_pairs()[0]
+        return PairLabels(arrPairs, len(inPoints), intMinSamples)
 def FindReciprocalVectors(inRealVectors: np.array): 
         # V = np.linalg.det(inRealVectors)
         # #rtnMatrix= np.matmul(np.transpose(inRealVectors),np.linalg.inv(np.matmul(inRealVectors,np.transpose(inRealVectors))))
@@ -873,6 +1003,196 @@ class PeriodicWrapperKDTree(object):
     def GetOriginalPoints(self):
         return self.__OriginalPoints
 
+class PeriodicFrameWrapper(object): #the periodic wrapper is found once for all the points in a frame. Grains, grain boundaries and junction lines
+    #are then queried through PeriodicSubsetKDTree objects which only mask this wrapper.
+    def __init__(self, inPoints,inPeriodicVectors,inConstraints, fltWrapperLength, lstBoundaryType = ['p','p','p']):
+        self.__OriginalPoints = np.copy(inPoints)
+        self.__WrapperWidth = fltWrapperLength
+        arrExtendedPoints, arrUniqueIndices = AddPeriodicWrapperAndIndices(inPoints, inPeriodicVectors,inConstraints,fltWrapperLength,lstBoundaryType)
+        self.__ExtendedPoints = arrExtendedPoints
+        self.__UniqueIndices = arrUniqueIndices
+        arrOutside = np.zeros(len(arrExtendedPoints)) #distance of each wrapper point outside the cell so narrower wrappers can be selected
+        for i in range(len(inConstraints)):
+            if lstBoundaryType[i] == 'p':
+                arrDots = np.matmul(arrExtendedPoints, inConstraints[i,:-1])
+                arrOutside = np.maximum(arrOutside, np.maximum(-arrDots, arrDots - inConstraints[i,-1]))
+        arrOutside[:len(inPoints)] = 0
+        self.__OutsideDistances = arrOutside
+    def GetWrapperLength(self):
+        return self.__WrapperWidth
+    def GetOriginalPoints(self):
+        return self.__OriginalPoints
+    def GetExtendedPoints(self):
+        return self.__ExtendedPoints
+    def GetUniqueIndices(self):
+        return self.__UniqueIndices
+    def GetOutsideDistances(self):
+        return self.__OutsideDistances
+    def GetSubset(self, inRows, fltWrapperLength = None):
+        return PeriodicSubsetKDTree(self, inRows, fltWrapperLength)
+
+class PeriodicSubsetKDTree(object): #same interface as PeriodicWrapperKDTree for the rows inRows of a PeriodicFrameWrapper
+    def __init__(self, objFrameWrapper: PeriodicFrameWrapper, inRows, fltWrapperLength = None):
+        if fltWrapperLength is None or fltWrapperLength > objFrameWrapper.GetWrapperLength():
+            fltWrapperLength = objFrameWrapper.GetWrapperLength()
+        self.__WrapperWidth = fltWrapperLength
+        arrRows = np.unique(np.array(inRows, dtype='int'))
+        arrLocalRows = -np.ones(len(objFrameWrapper.GetOriginalPoints()), dtype='int')
+        arrLocalRows[arrRows] = np.arange(len(arrRows))
+        arrFrameUnique = objFrameWrapper.GetUniqueIndices()
+        arrMask = (arrLocalRows[arrFrameUnique] >= 0) & (objFrameWrapper.GetOutsideDistances() <= fltWrapperLength + 1e-5)
+        self.__ExtendedRows = np.where(arrMask)[0]
+        self.__UniqueIndices = arrLocalRows[arrFrameUnique[self.__ExtendedRows]]
+        self.__OriginalPoints = objFrameWrapper.GetOriginalPoints()[arrRows]
+        self.__ExtendedPoints = objFrameWrapper.GetExtendedPoints()[self.__ExtendedRows]
+        self.__SubsetTree = None
+    def GetSubsetTree(self): #the wrapper is masked from the frame so only a KDTree of the subset points is made, on first use
+        if self.__SubsetTree is None:
+            self.__SubsetTree = KDTree(self.__ExtendedPoints)
+        return self.__SubsetTree
+    def Pquery_radius(self, inPoints: np.array, fltRadius: float,blnReturnDistance=True, blnSortResults=True):
+        arrIndices, arrDistances = self.GetSubsetTree().query_radius(inPoints, fltRadius,return_distance=blnReturnDistance,sort_results=blnSortResults)
+        return arrIndices, arrDistances
+    def Pquery(self,inPoints:np.array,k=1):
+        arrDistances, arrIndices = self.GetSubsetTree().query(inPoints, k=k)
+        return arrDistances, arrIndices
+    def GetExtendedPoints(self):
+        return self.__ExtendedPoints
+    def GetPeriodicIndices(self, inRealIndices: list)->list:
+        return list(map(lambda x: self.__UniqueIndices[x],inRealIndices))
+    def GetWrapperLength(self):
+        return self.__WrapperWidth
+    def GetOriginalPoints(self):
+        return self.__OriginalPoints
+
+class CellList(object): #linked cell list binned in fractional coordinates so tilted cells need no wrapper points. Indices returned
+    #are always rows of inPoints so GetPeriodicIndices is the identity and this can stand in for PeriodicWrapperKDTree in radius queries.
+    def __init__(self, inPoints: np.array, inCellVectors: np.array, fltCutoff: float, lstBoundaryType = ['p','p','p']):
+        self.__OriginalPoints = np.copy(inPoints)
+        self.__CellVectors = np.copy(inCellVectors)
+        self.__InverseBasis = np.linalg.inv(inCellVectors)
+        self.__Cutoff = fltCutoff
+        self.__Periodic = np.array(list(map(lambda x: x == 'p', lstBoundaryType)))
+        intDimensions = len(inCellVectors)
+        arrFractional = np.matmul(inPoints, self.__InverseBasis)
+        arrFractional[:,self.__Periodic] -= np.floor(arrFractional[:,self.__Periodic])
+        self.__Widths = 1/np.linalg.norm(self.__InverseBasis, axis=0) #perpendicular width of the cell along each fractional axis
+        arrLower = np.zeros(intDimensions)
+        arrExtent = np.ones(intDimensions)
+        if len(inPoints) > 0 and not(np.all(self.__Periodic)):
+            arrNonPeriodic = ~self.__Periodic
+            arrLower[arrNonPeriodic] = np.min(arrFractional[:,arrNonPeriodic],axis=0)
+            arrExtent[arrNonPeriodic] = np.max(arrFractional[:,arrNonPeriodic],axis=0) - arrLower[arrNonPeriodic]
+            arrExtent[arrExtent == 0] = 1
+        arrBins = np.maximum(np.floor(arrExtent*self.__Widths/fltCutoff),1).astype('int')
+        intMaxBins = 4*len(inPoints) + 1 #stops sparse point sets in large cells from making mostly empty bins
+        if np.prod(arrBins) > intMaxBins:
+            arrBins = np.maximum(np.floor(arrBins*(intMaxBins/np.prod(arrBins))**(1/intDimensions)),1).astype('int')
+        self.__Lower = arrLower
+        self.__Bins = arrBins
+        self.__BinWidths = arrExtent/arrBins
+        arrLinear = np.ravel_multi_index(tuple(np.transpose(self.__FindBins(arrFractional))), tuple(arrBins))
+        self.__Order = np.argsort(arrLinear, kind='stable')
+        self.__Starts = np.append(0,np.cumsum(np.bincount(arrLinear, minlength=np.prod(arrBins))))
+        self.__SortedColumns = list(np.transpose(np.matmul(arrFractional, inCellVectors)[self.__Order]).copy()) #positions wrapped into the cell
+    def __FindBins(self, inFractional: np.array)->np.array:
+        arrBins = np.floor((inFractional - self.__Lower)/self.__BinWidths).astype('int')
+        return np.clip(arrBins, 0, self.__Bins-1)
+    def __FindPairs(self, inPoints: np.array, fltRadius: float, intChunkSize: int):
+        #yields the query rows, point rows and distances of all pairs within fltRadius, intChunkSize query points at a time
+        arrPoints = np.reshape(np.array(inPoints, dtype='float'), (-1, len(self.__CellVectors)))
+        arrLayers = np.ceil(fltRadius/(self.__BinWidths*self.__Widths)).astype('int')
+        arrOffsets = np.array(list(it.product(*map(lambda x: range(-x,x+1), arrLayers))))
+        arrFractional = np.matmul(arrPoints, self.__InverseBasis)
+        arrImages = np.zeros(np.shape(arrFractional))
+        arrImages[:,self.__Periodic] = np.floor(arrFractional[:,self.__Periodic])
+        arrAllBins = self.__FindBins(arrFractional - arrImages)
+        arrQueryOrder = np.argsort(np.ravel_multi_index(tuple(np.transpose(arrAllBins)), tuple(self.__Bins)), kind='stable') #neighbouring queries then read neighbouring bins
+        for i in range(0, len(arrPoints), intChunkSize):
+            arrChunk = arrQueryOrder[i:i+intChunkSize]
+            arrQuery = arrPoints[arrChunk] - np.matmul(arrImages[arrChunk], self.__CellVectors)
+            arrQueryBins = arrAllBins[arrChunk]
+            lstQueryRows = []
+            lstPointRows = []
+            lstDistances = []
+            for arrOffset in arrOffsets:
+                arrTargets = arrQueryBins + arrOffset
+                arrShifts = np.floor_divide(arrTargets, self.__Bins)
+                arrShifts[:,~self.__Periodic] = 0
+                arrTargets = arrTargets - arrShifts*self.__Bins
+                arrValid = np.where(np.all((arrTargets >= 0) & (arrTargets < self.__Bins),axis=1))[0]
+                if len(arrValid) == 0:
+                    continue
+                arrLinear = np.ravel_multi_index(tuple(np.transpose(arrTargets[arrValid])), tuple(self.__Bins))
+                arrCounts = self.__Starts[arrLinear+1] - self.__Starts[arrLinear]
+                intTotal = np.sum(arrCounts)
+                if intTotal == 0:
+                    continue
+                arrRows = np.repeat(arrValid, arrCounts)
+                arrPositions = np.repeat(self.__Starts[arrLinear] - np.cumsum(arrCounts) + arrCounts, arrCounts) + np.arange(intTotal)
+                arrShifted = arrQuery[arrValid] - np.matmul(arrShifts[arrValid], self.__CellVectors) #move the query rather than every candidate
+                arrSquared = np.zeros(intTotal)
+                for k in range(len(self.__SortedColumns)):
+                    arrSquared += (self.__SortedColumns[k][arrPositions] - np.repeat(arrShifted[:,k], arrCounts))**2
+                arrClose = np.where(arrSquared <= fltRadius**2)[0]
+                lstQueryRows.append(arrChunk[arrRows[arrClose]])
+                lstPointRows.append(self.__Order[arrPositions[arrClose]])
+                lstDistances.append(np.sqrt(arrSquared[arrClose]))
+            if len(lstQueryRows) > 0:
+                yield np.concatenate(lstQueryRows), np.concatenate(lstPointRows), np.concatenate(lstDistances)
+    def Pquery_radius(self, inPoints: np.array, fltRadius = None, blnReturnDistance=True, blnSortResults=True, intChunkSize = 100000):
+        if fltRadius is None:
+            fltRadius = self.__Cutoff
+        intLength = len(np.reshape(inPoints, (-1, len(self.__CellVectors))))
+        lstPairs = list(self.__FindPairs(inPoints, fltRadius, intChunkSize))
+        if len(lstPairs) > 0:
+            arrQueryRows, arrPointRows, arrDistances = map(np.concatenate, zip(*lstPairs))
+        else:
+            arrQueryRows, arrPointRows, arrDistances = np.zeros(0,dtype='int'),np.zeros(0,dtype='int'),np.zeros(0)
+        if blnSortResults:
+            arrOrder = np.lexsort((arrDistances, arrQueryRows))
+        else:
+            arrOrder = np.argsort(arrQueryRows, kind='stable')
+        arrSplits = np.cumsum(np.bincount(arrQueryRows, minlength=intLength))[:-1]
+        arrIndices = np.empty(intLength, dtype='object')
+        arrReturnDistances = np.empty(intLength, dtype='object')
+        for j, (arrRow, arrDistanceRow) in enumerate(zip(np.split(arrPointRows[arrOrder], arrSplits),np.split(arrDistances[arrOrder], arrSplits))):
+            if j < intLength:
+                arrIndices[j] = arrRow
+                arrReturnDistances[j] = arrDistanceRow
+        if blnReturnDistance:
+            return arrIndices, arrReturnDistances
+        else:
+            return arrIndices
+    def Pquery_pairs(self, fltRadius = None, intChunkSize = 100000): #each pair i < j within fltRadius, once for each periodic image which is close enough
+        if fltRadius is None:
+            fltRadius = self.__Cutoff
+        lstPairs = []
+        lstDistances = []
+        for arrQueryRows, arrPointRows, arrDistances in self.__FindPairs(self.__OriginalPoints, fltRadius, intChunkSize):
+            arrRows = arrQueryRows < arrPointRows
+            lstPairs.append(np.transpose([arrQueryRows[arrRows], arrPointRows[arrRows]]))
+            lstDistances.append(arrDistances[arrRows])
+        if len(lstPairs) == 0:
+            return np.zeros([0,2],dtype='int'), np.zeros(0)
+        return np.concatenate(lstPairs), np.concatenate(lstDistances)
+    def Pcount_neighbours(self, inPoints: np.array, fltRadius = None, intChunkSize = 100000): #as KDTree.query_radius with count_only=True
+        if fltRadius is None:
+            fltRadius = self.__Cutoff
+        intLength = len(np.reshape(inPoints, (-1, len(self.__CellVectors))))
+        arrCounts = np.zeros(intLength, dtype='int')
+        for arrQueryRows, arrPointRows, arrDistances in self.__FindPairs(inPoints, fltRadius, intChunkSize):
+            arrCounts += np.bincount(arrQueryRows, minlength=intLength)
+        return arrCounts
+    def GetPeriodicIndices(self, inRealIndices: list)->list:
+        return list(inRealIndices)
+    def GetExtendedPoints(self):
+        return self.__OriginalPoints
+    def GetOriginalPoints(self):
+        return self.__OriginalPoints
+    def GetCutoff(self):
+        return self.__Cutoff
+
 class PeriodicFullKDTree(object):
     def __init__(self, inPoints: np.array,inPeriodicVectors: np.array):
         self.__OriginalPoints = np.copy(inPoints)
@@ -947,6 +1267,25 @@ def FindPrimitiveVectors( inLatticePoints):
         lstVectors.append(arrVector3)
         arrPrimitiveVectors = np.vstack(lstVectors)
         return arrPrimitiveVectors
+def ReduceLatticeBasis(inBasisVectors: np.array, intMaxIter = 1000): #greedy pairwise reduction, shortens a skewed lattice basis without changing the lattice
+        arrBasis = np.copy(inBasisVectors).astype('float')
+        blnChanged = True
+        n = 0
+        while blnChanged and n < intMaxIter:
+                blnChanged = False
+                for i in range(len(arrBasis)):
+                        for j in range(len(arrBasis)):
+                                if i != j:
+                                        intShift = np.round(np.dot(arrBasis[i],arrBasis[j])/np.dot(arrBasis[j],arrBasis[j]))
+                                        if intShift != 0:
+                                                arrBasis[i] = arrBasis[i] - intShift*arrBasis[j]
+                                                blnChanged = True
+                n += 1
+        return arrBasis[np.argsort(np.linalg.norm(arrBasis,axis=1))]
+def LatticePointsFromBasis(inBasisVectors: np.array, intRange = 3): #all lattice points with integer coefficients from -intRange to intRange
+        arrRange = np.arange(-intRange, intRange+1)
+        arrCoefficients = np.stack(np.meshgrid(arrRange,arrRange,arrRange, indexing='ij'),axis=-1).reshape(-1,3)
+        return np.matmul(arrCoefficients, inBasisVectors)
 def PrimitiveToOrthogonalVectorsGrammSchmdit(inPrimitiveVectors,arrPrimitiveCells):
         arrLengths = np.linalg.norm(inPrimitiveVectors,axis=1)
         arrRows = np.argsort(arrLengths)
@@ -1300,37 +1639,39 @@ class EcoOrient(object):
         def __init__(self,fltCutOff: float,fltTolerance: float):
                 self.__CutOff = fltCutOff
                 self.__Tolerance = fltTolerance
+                self.__BasisData = dict() #reciprocal vectors and norm factor for each primitive basis, found once
+        def GetBasisData(self, arrPrimitive1):
+                strKey = np.round(np.array(arrPrimitive1,dtype='float'),8).tobytes()
+                if strKey not in self.__BasisData:
+                        arrVectors = GetLinearCombinations(arrPrimitive1,4)
+                        arrVectors = arrVectors[np.linalg.norm(arrVectors,axis=1) <= self.__CutOff]
+                        arrReciprocal = FindReciprocalVectors(arrPrimitive1)
+                        arrWeights = self.EcoWeights(arrVectors)
+                        arrZ = arrWeights[:,np.newaxis]*np.exp(2j*np.pi*np.matmul(arrVectors,np.transpose(arrReciprocal)))
+                        fltNorm = 3*np.sum(arrWeights)**2-np.sum(np.real(arrZ*np.conj(arrZ)))
+                        self.__BasisData[strKey] = (arrReciprocal, fltNorm)
+                return self.__BasisData[strKey]
         def GetNormFactor(self,arrPrimitive1):
-                arrVectors = GetLinearCombinations(arrPrimitive1,4)
-                arrRows = np.where(np.linalg.norm(arrVectors,axis=1) <= self.__CutOff)[0]
-                arrVectors = arrVectors[arrRows]
-                fltTotalWeight = 0
-                zTotal = 0
-                arrReciprocal = FindReciprocalVectors(arrPrimitive1)
-                for a in arrVectors:
-                        fltWeight = self.EcoWeight(a, self.__CutOff)
-                        fltTotalWeight += fltWeight
-                        for q in arrReciprocal:
-                                rtnZ,fltWeight = self.PrimitiveReciprocalProduct(a,q)
-                                zTotal += rtnZ*rtnZ.conjugate()
-                return 3*fltTotalWeight**2-np.real(zTotal)
+                return self.GetBasisData(arrPrimitive1)[1]
         def PrimitiveReciprocalProduct(self, arrPrimitive, arrReciprocal):
                 fltWeight = self.EcoWeight(arrPrimitive,self.__CutOff)
-                z = np.complex(0,np.dot(arrPrimitive,arrReciprocal))
-                rtnZ = fltWeight*np.complex(np.exp(2*np.pi*z))
+                rtnZ = fltWeight*np.exp(2j*np.pi*np.dot(arrPrimitive,arrReciprocal))
                 return rtnZ, fltWeight
         def EcoOrientPsiFunction(self,arrTestVector, arrPrimitiveBasis1):#fit of basis2 with respect to basis1
-                arrQ = FindReciprocalVectors(arrPrimitiveBasis1)
-                rtnPsi = np.complex(0)
-                for q in arrQ:
-                        rtnZ = np.complex(0)
-                        fltTotalWeight = 0
-                        for a in arrTestVector:
-                                Z,fltWeight  = self.PrimitiveReciprocalProduct(a,q)
-                                rtnZ += Z
-                                fltTotalWeight += fltWeight
-                        rtnPsi += rtnZ*rtnZ.conjugate()
-                return np.real(np.complex(rtnPsi)), fltTotalWeight
+                arrVectors = np.reshape(arrTestVector,(-1,3))
+                arrPsi = self.EcoOrientPsiFunctions(np.zeros(len(arrVectors),dtype='int'),arrVectors,1,arrPrimitiveBasis1)
+                return arrPsi[0], np.sum(self.EcoWeights(arrVectors))
+        def EcoOrientPsiFunctions(self, inRows, inVectors, intLength: int, arrPrimitiveBasis1): #psi for intLength sites at once where
+                #inVectors[k] is a neighbour vector of site inRows[k]
+                arrReciprocal = self.GetBasisData(arrPrimitiveBasis1)[0]
+                arrWeights = self.EcoWeights(inVectors)
+                arrPhases = 2*np.pi*np.matmul(inVectors,np.transpose(arrReciprocal))
+                arrPsi = np.zeros(intLength)
+                for k in range(len(arrReciprocal)):
+                        arrReal = np.bincount(inRows, weights=arrWeights*np.cos(arrPhases[:,k]), minlength=intLength)
+                        arrImaginary = np.bincount(inRows, weights=arrWeights*np.sin(arrPhases[:,k]), minlength=intLength)
+                        arrPsi += arrReal**2 + arrImaginary**2
+                return arrPsi
         def EcoWeight(self,inRealVector, fltCutOff):
                 if self.__CutOff == 0:
                         fltReturn = 1
@@ -1341,25 +1682,45 @@ class EcoOrient(object):
                         else:
                                 fltReturn = 0
                 return fltReturn 
+        def EcoWeights(self, inRealVectors): #EcoWeight for each row of inRealVectors
+                arrVectors = np.reshape(inRealVectors,(-1,3))
+                if self.__CutOff == 0:
+                        return np.ones(len(arrVectors))
+                arrLengths = np.linalg.norm(arrVectors,axis=1)/self.__CutOff
+                return np.where(np.round(arrLengths,5) < 1, arrLengths**4 -2*arrLengths**2 + 1, 0)
+        def ScaleOrderParameters(self, inValues):
+                arrValues = np.array(inValues,dtype='float')
+                arrReturn = np.sin(arrValues*np.pi/(2*self.__Tolerance))
+                arrReturn[arrValues > self.__Tolerance] = 1
+                arrReturn[arrValues < -self.__Tolerance] = -1
+                return arrReturn
         def GetOrderParameter(self,arrTestVectors,arrPrimitive1,arrPrimitive2):
                 N = self.GetNormFactor(arrPrimitive1)
                 flt1 = self.EcoOrientPsiFunction(arrTestVectors,arrPrimitive1)[0]
                 flt2 = self.EcoOrientPsiFunction(arrTestVectors,arrPrimitive2)[0]
                 fltValue = (flt1-flt2)/N
-                if fltValue > self.__Tolerance:
-                        fltReturn = 1
-                elif fltValue < -self.__Tolerance:
-                        fltReturn = -1
+                return self.ScaleOrderParameters([fltValue])[0]
+        def GetOrderParameters(self, lstNeighbourVectors, arrPrimitive1, arrPrimitive2): #one order parameter per site. lstNeighbourVectors[i]
+                #holds the neighbour vectors of site i, e.g. as a list of arrays or as an array of shape (sites, neighbours, 3)
+                intLength = len(lstNeighbourVectors)
+                lstVectors = list(map(lambda x: np.reshape(x,(-1,3)), lstNeighbourVectors))
+                arrCounts = np.array(list(map(len, lstVectors)),dtype='int')
+                arrRows = np.repeat(np.arange(intLength), arrCounts)
+                if len(arrRows) > 0:
+                        arrVectors = np.vstack(lstVectors)
                 else:
-                        fltReturn = np.sin(fltValue*np.pi/(2*self.__Tolerance))
-                return fltReturn
+                        arrVectors = np.zeros([0,3])
+                return self.GetOrderParametersFromPairs(arrRows, arrVectors, intLength, arrPrimitive1, arrPrimitive2)
+        def GetOrderParametersFromPairs(self, inRows, inVectors, intLength: int, arrPrimitive1, arrPrimitive2): #as GetOrderParameters with
+                #the neighbour vectors flattened so inVectors[k] belongs to site inRows[k]
+                arrRows = np.array(inRows,dtype='int')
+                arrVectors = np.reshape(np.array(inVectors,dtype='float'),(-1,3))
+                N = self.GetNormFactor(arrPrimitive1)
+                arrValues = (self.EcoOrientPsiFunctions(arrRows,arrVectors,intLength,arrPrimitive1)-self.EcoOrientPsiFunctions(arrRows,arrVectors,intLength,arrPrimitive2))/N
+                return self.ScaleOrderParameters(arrValues)
 def GetLinearCombinations(arr3Vectors, intNLimit: int):
-        lstAllVectors = []
-        for i in range(-intNLimit,intNLimit):
-                for j in range(-intNLimit,intNLimit):
-                        for k in range(-intNLimit,intNLimit):
-                                lstAllVectors.append(arr3Vectors[0]*i+arr3Vectors[1]*j+arr3Vectors[2]*k)
-        return np.vstack(lstAllVectors)
+        arrCoefficients = np.array(list(it.product(range(-intNLimit,intNLimit),repeat=3)))
+        return np.matmul(arrCoefficients, arr3Vectors)
 def GroupClustersPeriodically(lstPoints: np.array, arrPeriodicVectors: np.array, fltMinDistance: float, lstBoundary = ['pp','pp','pp']):
         intLength = len(lstPoints)
         lstAllMatches = []
@@ -22,6 +22,12 @@ from sklearn.cluster import KMeans
 import MiscFunctions as mf
 import matplotlib.pyplot as plt
 import itertools as it
+import io
+import os
+import json
+import glob
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
 
 class LAMMPSDat(object):
     def __init__(self,strFilename, blnImportAtomPostions = False):
@@ -83,115 +89,329 @@ class LAMMPSDat(object):
     def GetValues(self):
         return  self.__Values
 
-class LAMMPSLog(object):
-    def __init__(self,strFilename):
+class LAMMPSLog(object): #thermo blocks are found by their Step and Loop lines and each block is converted in one call. A final block
+    #with no Loop line, from a running or killed job, is kept and Update() continues it from the byte offset where the last read stopped.
+    #blnFinal says the file is complete so a last line with no newline is parsed. Pass blnFinal=False to follow a log that is still being written.
+    def __init__(self,strFilename, blnFinal = True):
         self.__FileName = strFilename
         self.__Values = dict()
         self.__ColumnNames = dict()
         self.__Stages = 0
-        dctValues = dict()
-        dctColumns = dict()
-        intStages = 0
-        with open(strFilename) as Dfile:
-            while True:
-                lstBounds = []
-                try:
-                    line = next(Dfile).strip()
-                except StopIteration as EndOfFile:
-                    break
-                if "Step" == line[:4]:
-                    lstColumnNames = line.split(' ')
-                    lstRows = []
-                    line = next(Dfile).strip()
-                    while "Loop" != line[:4]:
-                        lstRow = list(map(float,line.strip().split()))
-                        lstRows.append(lstRow)
-                        line = next(Dfile).strip()
-                    arrValues = np.vstack(lstRows)
-                    dctValues[intStages] = arrValues
-                    dctColumns[intStages] = lstColumnNames
-                    intStages += 1    
-            self.__Values = dctValues 
-            self.__ColumnNames = dctColumns
-            self.__Stages = intStages
-            Dfile.close()
+        self.__Offset = 0
+        self.__OpenStage = None #stage still waiting for its Loop line
+        self.Update(blnFinal)
+    def Update(self, blnFinal = False)->int: #reads any lines added since the last read and returns the number of new thermo rows
+        with open(self.__FileName, 'rb') as Dfile:
+            Dfile.seek(self.__Offset)
+            bytText = Dfile.read()
+        if blnFinal:
+            intEnd = len(bytText)
+        else:
+            intEnd = bytText.rfind(b'\n') + 1 #a partly written last line is left for the next update
+        self.__Offset += intEnd
+        return self.__ParseText(bytText[:intEnd].decode(errors='replace'))
+    def __ParseText(self, strText: str)->int:
+        intRows = 0
+        intStart = 0
+        for intLineStart, intLineEnd in FindLogMarkers(strText):
+            if self.__OpenStage is not None:
+                intRows += self.__AppendRows(strText[intStart:intLineStart])
+            strLine = strText[intLineStart:intLineEnd].strip()
+            if strLine[:4] == "Step":
+                self.__OpenStage = self.__Stages
+                self.__ColumnNames[self.__Stages] = strLine.split()
+                self.__Values[self.__Stages] = np.zeros([0,len(self.__ColumnNames[self.__Stages])])
+                self.__Stages += 1
+            else:
+                self.__OpenStage = None
+            intStart = intLineEnd
+        if self.__OpenStage is not None:
+            intRows += self.__AppendRows(strText[intStart:])
+        return intRows
+    def __AppendRows(self, strBlock: str)->int:
+        intColumns = len(self.__ColumnNames[self.__OpenStage])
+        if len(strBlock.strip()) == 0:
+            return 0
+        lstLines = strBlock.splitlines()
+        try:
+            arrRows = np.loadtxt(lstLines, dtype=np.float64, ndmin=2)
+            if np.shape(arrRows)[1] != intColumns:
+                raise ValueError
+        except ValueError: #warnings or other output printed inside the block are skipped
+            lstLines = list(filter(lambda x: IsThermoRow(x, intColumns), lstLines))
+            if len(lstLines) == 0:
+                return 0
+            arrRows = np.loadtxt(lstLines, dtype=np.float64, ndmin=2)
+        self.__Values[self.__OpenStage] = np.append(self.__Values[self.__OpenStage], arrRows, axis=0)
+        return len(arrRows)
     def GetNumberOfStages(self):
             return self.__Stages
     def GetValues(self, intStage):
             return self.__Values[intStage]
     def GetColumnNames(self, intStage):
             return self.__ColumnNames[intStage]    
+    def IsStageComplete(self, intStage)->bool: #False for a final stage with no Loop line yet
+            return intStage != self.__OpenStage
+    def GetOffset(self)->int:
+            return self.__Offset
+
+def FindLogMarkers(strText: str)->list: #start and end of each line beginning with Step or Loop time, in file order
+    lstMarkers = []
+    for strMarker in ["Step", "Loop time"]:
+        intPosition = strText.find(strMarker)
+        while intPosition >= 0:
+            intLineStart = strText.rfind('\n', 0, intPosition) + 1
+            intLineEnd = strText.find('\n', intPosition)
+            if intLineEnd < 0:
+                intLineEnd = len(strText)
+            if len(strText[intLineStart:intPosition].strip()) == 0 and (strMarker != "Step" or strText[intPosition+4:intPosition+5].isspace()):
+                lstMarkers.append((intLineStart, intLineEnd))
+            intPosition = strText.find(strMarker, intLineEnd)
+    return sorted(lstMarkers)
+
+def IsThermoRow(strLine: str, intColumns: int)->bool:
+    lstValues = strLine.split()
+    if len(lstValues) != intColumns:
+        return False
+    try:
+        list(map(float, lstValues))
+    except ValueError:
+        return False
+    return True
+
+def ReadAtomBlock(Dfile, intNumberOfAtoms: int, intNumberOfColumns: int, arrBuffer = None, intChunkSize = 100000, lstUseColumns = None):
+    #reads the N lines of an ITEM: ATOMS block in bulk, intChunkSize lines at a time, rather than row by row. If arrBuffer
+    #is given the block is parsed into it and a view of the first N rows is returned. lstUseColumns restricts the
+    #conversion to those column indices and intNumberOfColumns is then the number of selected columns. A block cut short by the
+    #end of the file raises EOFError where the old row by row loop let StopIteration escape, so callers must catch EOFError.
+    if arrBuffer is None:
+        arrValues = np.zeros([intNumberOfAtoms, intNumberOfColumns])
+    else:
+        if len(arrBuffer) < intNumberOfAtoms or np.shape(arrBuffer)[1] != intNumberOfColumns:
+            raise Exception("Buffer of shape " + str(np.shape(arrBuffer)) + " cannot hold " + str(intNumberOfAtoms) + " atoms with " + str(intNumberOfColumns) + " columns")
+        arrValues = arrBuffer[:intNumberOfAtoms]
+    lstLastRow = []
+    for i in range(0, intNumberOfAtoms, intChunkSize):
+        intRows = min(intChunkSize, intNumberOfAtoms-i)
+        lstLines = list(it.islice(Dfile, intRows))
+        if len(lstLines) != intRows:
+            raise EOFError("Unexpected end of file after " + str(i+len(lstLines)) + " of " + str(intNumberOfAtoms) + " atoms")
+        arrChunk = np.loadtxt(lstLines, dtype=np.float64, ndmin=2, usecols=lstUseColumns)
+        if np.shape(arrChunk) != (intRows, intNumberOfColumns):
+            raise Exception("Expected " + str(intNumberOfColumns) + " columns but found " + str(np.shape(arrChunk)[1]))
+        arrValues[i:i+intRows] = arrChunk
+        lstLastRow = lstLines[-1].strip().split()
+    if lstUseColumns is not None and len(lstLastRow) > 0:
+        lstLastRow = [lstLastRow[j] for j in lstUseColumns]
+    return arrValues, lstLastRow
+
+def FindColumnTypes(lstRow: list, intNumberOfColumns: int)->list:
+    #integer columns are inferred from the last row of each block, defaulting to floats
+    lstColumnTypes = []
+    for j in range(intNumberOfColumns):
+        if j < len(lstRow) and "." not in lstRow[j]:
+            lstColumnTypes.append('%i')
+        else:
+            lstColumnTypes.append('%s')
+    return lstColumnTypes
+
+def ReadDumpHeader(Dfile):
+    #returns the timestep, number of atoms, boundary types, bounds and column names or None at the end of the file
+    try:
+        line = next(Dfile).strip()
+    except StopIteration as EndOfFile:
+        return None
+    if "ITEM: TIMESTEP" != line:
+        raise Exception("Unexpected "+repr(line))
+    timestep = int(next(Dfile).strip())
+    line = next(Dfile).strip()
+    if "ITEM: NUMBER OF ATOMS" != line:
+        raise Exception("Unexpected "+repr(line))
+    N = int(next(Dfile).strip())
+    line = next(Dfile).strip()
+    if "ITEM: BOX BOUNDS" != line[0:16]:
+        raise Exception("Unexpected "+repr(line))
+    lstBoundaryType = line[17:].strip().split()
+    lstBounds = []
+    lstBounds.append(list(map(float, next(Dfile).strip().split())))
+    lstBounds.append(list(map(float, next(Dfile).strip().split())))
+    if len(lstBoundaryType)%3 == 0:
+        lstBounds.append(list(map(float, next(Dfile).strip().split())))
+    line = next(Dfile).strip()
+    if "ITEM: ATOMS id" != line[0:14]:
+        raise Exception("Unexpected "+repr(line))
+    lstColumnNames = line[11:].strip().split()
+    return timestep, N, lstBoundaryType, lstBounds, lstColumnNames
+
+def SelectColumns(lstColumnNames: list, lstColumns: list)->list:
+    #returns the indices of the requested columns in file order. The id and position columns are always kept as the 
+    #analysis objects need them.
+    if lstColumns is None:
+        return None
+    lstMissing = [strName for strName in lstColumns if strName not in lstColumnNames]
+    if len(lstMissing) > 0:
+        warnings.warn('Columns ' + str(lstMissing) + ' are not in the dump file')
+    return [j for j, strName in enumerate(lstColumnNames) if strName in lstColumns or strName in ['id','x','y','z']]
+
+def ProjectHeader(tupHeader: tuple, lstIndices: list)->tuple:
+    if lstIndices is None:
+        return tupHeader
+    return tupHeader[:4] + ([tupHeader[4][j] for j in lstIndices],)
+
+def ReadDumpFrame(Dfile, lstColumns = None):
+    #returns the header, the atom data and the column formats of the next time step or None at the end of the file
+    tupHeader = ReadDumpHeader(Dfile)
+    if tupHeader is None:
+        return None
+    lstIndices = SelectColumns(tupHeader[4], lstColumns)
+    tupHeader = ProjectHeader(tupHeader, lstIndices)
+    intNumberOfColumns = len(tupHeader[4])
+    arrValues, line = ReadAtomBlock(Dfile, tupHeader[1], intNumberOfColumns, lstUseColumns = lstIndices)
+    return tupHeader, arrValues, FindColumnTypes(line, intNumberOfColumns)
+
+def MakeTimeStep(tupHeader: tuple, arrValues: np.array, lstColumnTypes: list, strFilename: str, intLatticeType: int, fltLatticeParameter: float, objAnalysis: object):
+    timestep, N, lstBoundaryType, lstBounds, lstColumnNames = tupHeader
+    intNumberOfColumns = len(lstColumnNames)
+    objTimeStep = objAnalysis(timestep, N,intNumberOfColumns,lstColumnNames, lstBoundaryType, lstBounds,intLatticeType, fltLatticeParameter)
+    objTimeStep.SetColumnNames(lstColumnNames)
+    objTimeStep.SetAtomData(arrValues)
+    objTimeStep.SetColumnTypes(lstColumnTypes)
+    objTimeStep.CategoriseAtoms()
+    objTimeStep.SetFileName(strFilename)
+    return objTimeStep
+
+def ReadDumpTimeStep(Dfile, strFilename: str, intLatticeType: int, fltLatticeParameter: float, objAnalysis: object, lstColumns = None):
+    tupFrame = ReadDumpFrame(Dfile, lstColumns)
+    if tupFrame is None:
+        return None
+    return MakeTimeStep(*tupFrame, strFilename, intLatticeType, fltLatticeParameter, objAnalysis)
+
+def IterateTimeSteps(strFilename: str, intLatticeType: int, fltLatticeParameter: float, objAnalysis: object, blnReuseBuffer = False, blnUseCache = True, lstColumns = None):
+    #yields one time step at a time so a pass over a trajectory holds a single frame in memory. With blnReuseBuffer the 
+    #atom data of every frame is parsed into the same array, so a frame must be copied if it is needed after the next one is read.
+    if blnUseCache and IsDumpCacheCurrent(strFilename):
+        for dctHeader in ReadDumpCacheHeader(strFilename):
+            yield MakeTimeStep(*ReadDumpCacheFrame(strFilename, dctHeader, lstColumns), strFilename, intLatticeType, fltLatticeParameter, objAnalysis)
+        return
+    arrBuffer = None
+    with open(strFilename) as Dfile:
+        while True:
+            try:
+                tupHeader = ReadDumpHeader(Dfile)
+                if tupHeader is None:
+                    break
+                lstIndices = SelectColumns(tupHeader[4], lstColumns)
+                tupHeader = ProjectHeader(tupHeader, lstIndices)
+                intNumberOfColumns = len(tupHeader[4])
+                if blnReuseBuffer:
+                    if arrBuffer is None or len(arrBuffer) < tupHeader[1] or np.shape(arrBuffer)[1] != intNumberOfColumns:
+                        arrBuffer = np.zeros([tupHeader[1], intNumberOfColumns])
+                    arrValues, line = ReadAtomBlock(Dfile, tupHeader[1], intNumberOfColumns, arrBuffer, lstUseColumns = lstIndices)
+                else:
+                    arrValues, line = ReadAtomBlock(Dfile, tupHeader[1], intNumberOfColumns, lstUseColumns = lstIndices)
+            except (StopIteration, EOFError) as EndOfFile:
+                warnings.warn("The last time step in " + strFilename + " is truncated and has been ignored")
+                break
+            yield MakeTimeStep(tupHeader, arrValues, FindColumnTypes(line, intNumberOfColumns), strFilename, intLatticeType, fltLatticeParameter, objAnalysis)
+
+def GetDumpCacheDirectory(strFilename: str)->str:
+    return strFilename + '.cache'
+
+def IsDumpCacheCurrent(strFilename: str)->bool:
+    strHeader = os.path.join(GetDumpCacheDirectory(strFilename), 'header.json')
+    return os.path.isfile(strHeader) and os.path.getmtime(strHeader) >= os.path.getmtime(strFilename)
+
+def SaveDumpCache(strFilename: str, lstFrames: list):
+    #each time step is stored as one column major .npy so that a single column can be paged in on its own
+    strDirectory = GetDumpCacheDirectory(strFilename)
+    os.makedirs(strDirectory, exist_ok=True)
+    lstHeaders = []
+    for j, tupFrame in enumerate(lstFrames):
+        tupHeader, arrValues, lstColumnTypes = tupFrame
+        strFrame = 'frame' + str(j) + '.npy'
+        np.save(os.path.join(strDirectory, strFrame), np.asfortranarray(arrValues, dtype=np.float64))
+        dctHeader = dict()
+        dctHeader['TimeStep'] = tupHeader[0]
+        dctHeader['NumberOfAtoms'] = tupHeader[1]
+        dctHeader['BoundaryTypes'] = tupHeader[2]
+        dctHeader['Bounds'] = tupHeader[3]
+        dctHeader['ColumnNames'] = tupHeader[4]
+        dctHeader['ColumnTypes'] = lstColumnTypes
+        dctHeader['File'] = strFrame
+        lstHeaders.append(dctHeader)
+    strHeader = os.path.join(strDirectory, 'header.json')
+    with open(strHeader + '.tmp', 'w') as fHeader:
+        json.dump({'Version': 1, 'Source': os.path.basename(strFilename), 'Frames': lstHeaders}, fHeader)
+    os.replace(strHeader + '.tmp', strHeader) #the header is written last so an interrupted write is never treated as current
+
+def WriteDumpCache(strFilename: str):
+    lstFrames = []
+    with open(strFilename) as Dfile:
+        while True:
+            tupFrame = ReadDumpFrame(Dfile)
+            if tupFrame is None:
+                break
+            lstFrames.append(tupFrame)
+    SaveDumpCache(strFilename, lstFrames)
+
+def ReadDumpCacheHeader(strFilename: str)->list:
+    with open(os.path.join(GetDumpCacheDirectory(strFilename), 'header.json')) as fHeader:
+        dctCache = json.load(fHeader)
+    if dctCache['Version'] != 1:
+        raise Exception("Unsupported dump cache version " + str(dctCache['Version']))
+    return dctCache['Frames']
+
+def ReadDumpCacheFrame(strFilename: str, dctHeader: dict, lstColumns = None):
+    #the atom data is memory mapped copy on write so the cache is never modified and unused columns are not read
+    tupHeader = (dctHeader['TimeStep'], dctHeader['NumberOfAtoms'], dctHeader['BoundaryTypes'], dctHeader['Bounds'], list(dctHeader['ColumnNames']))
+    arrValues = np.load(os.path.join(GetDumpCacheDirectory(strFilename), dctHeader['File']), mmap_mode='c')
+    lstColumnTypes = list(dctHeader['ColumnTypes'])
+    lstIndices = SelectColumns(tupHeader[4], lstColumns)
+    if lstIndices is not None: #only the selected columns are copied out of the map
+        tupHeader = ProjectHeader(tupHeader, lstIndices)
+        arrValues = np.asfortranarray(arrValues[:, lstIndices])
+        lstColumnTypes = [lstColumnTypes[j] for j in lstIndices]
+    return tupHeader, arrValues, lstColumnTypes
+
+def GetFileNumber(strFilename: str)->int: #the time step in names such as 1Sim1000.dmp
+    lstNumbers = re.findall(r'(\d+)', os.path.basename(strFilename))
+    if len(lstNumbers) == 0:
+        return 0
+    return int(lstNumbers[-1])
 
 class LAMMPSData(object):
-    def __init__(self,strFilename: str, intLatticeType: int, fltLatticeParameter: float, objAnalysis: object):
+    def __init__(self,strFilename: str, intLatticeType: int, fltLatticeParameter: float, objAnalysis: object, blnUseCache = True, blnWriteCache = False, lstColumns = None):
         self.__dctTimeSteps = dict()
         self.__FileName = strFilename
         lstNumberOfAtoms = []
         lstTimeSteps = []
-        lstColumnNames = []
-        lstBoundaryType = []
         self.__Dimensions = 3 # assume 3d unless file shows the problem is 2d
-        intRow = 0
-        with open(strFilename) as Dfile:
-            while True:
-                lstBounds = []
-                try:
-                    line = next(Dfile).strip()
-                    intRow +=1
-                except StopIteration as EndOfFile:
-                    break
-                if "ITEM: TIMESTEP" != line:
-                    raise Exception("Unexpected "+repr(line))
-                timestep = int(next(Dfile).strip())
-                intRow +=1
-                lstTimeSteps.append(timestep)
-                line = next(Dfile).strip()
-                intRow +=1
-                if "ITEM: NUMBER OF ATOMS" != line:
-                    raise Exception("Unexpected "+repr(line))
-                N = int(next(Dfile).strip())
-                intRow +=1
-                lstNumberOfAtoms.append(N)
-                line = next(Dfile).strip()
-                intRow +=1
-                if "ITEM: BOX BOUNDS" != line[0:16]:
-                    raise Exception("Unexpected "+repr(line))
-                lstBoundaryType = line[17:].strip().split()
-                lstBounds.append(list(map(float, next(Dfile).strip().split())))
-                lstBounds.append(list(map(float, next(Dfile).strip().split())))
-                intRow +=2
-                if len(lstBoundaryType)%3 == 0:
-                    lstBounds.append(list(map(float, next(Dfile).strip().split())))
-                    intRow +=1
-                else:
-                    self.__Dimensions = 2
-                line = next(Dfile).strip()
-                intRow +=1
-                if "ITEM: ATOMS id" != line[0:14]:
-                    raise Exception("Unexpected "+repr(line))
-                lstColumnNames = line[11:].strip().split()
-                intNumberOfColumns = len(lstColumnNames)
-                objTimeStep = objAnalysis(timestep, N,intNumberOfColumns,lstColumnNames, lstBoundaryType, lstBounds,intLatticeType, fltLatticeParameter)
-                objTimeStep.SetColumnNames(lstColumnNames)
-                #arrValues = np.loadtxt(strFilename, skiprows =intRow , max_rows=N)
-                #objTimeStep.SetAtomData(arrValues)
-                intRow += N
-                for i in range(N):
-                     line = next(Dfile).strip().split()
-                     objTimeStep.SetRow(i,list(map(float,line)))
-                lstColumnTypes = []
-                for j in line:
-                    if "." in j:
-                        lstColumnTypes.append('%s')
-                    else:
-                        lstColumnTypes.append('%i')
-                objTimeStep.SetColumnTypes(lstColumnTypes) 
-                objTimeStep.CategoriseAtoms()
-                objTimeStep.SetFileName(strFilename)
-                self.__dctTimeSteps[str(timestep)] = objTimeStep            
-            Dfile.close()
-            self.__lstTimeSteps = lstTimeSteps
-            self.__lstNumberOfAtoms = lstNumberOfAtoms
+        if blnUseCache and IsDumpCacheCurrent(strFilename):
+            lstFrames = list(map(lambda x: ReadDumpCacheFrame(strFilename, x, lstColumns), ReadDumpCacheHeader(strFilename)))
+            blnWriteCache = False
+        else:
+            lstFrames = []
+            with open(strFilename) as Dfile:
+                while True:
+                    tupFrame = ReadDumpFrame(Dfile, lstColumns)
+                    if tupFrame is None:
+                        break
+                    lstFrames.append(tupFrame)
+                Dfile.close()
+        if blnWriteCache and lstColumns is not None:
+            warnings.warn('The dump cache is only written when all columns are read')
+        elif blnWriteCache:
+            SaveDumpCache(strFilename, lstFrames)
+        for tupFrame in lstFrames:
+            objTimeStep = MakeTimeStep(*tupFrame, strFilename, intLatticeType, fltLatticeParameter, objAnalysis)
+            timestep = objTimeStep.GetTimeStep()
+            lstTimeSteps.append(timestep)
+            lstNumberOfAtoms.append(objTimeStep.GetNumberOfAtoms())
+            if objTimeStep.GetNumberOfDimensions() == 2:
+                self.__Dimensions = 2
+            self.__dctTimeSteps[str(timestep)] = objTimeStep            
+        self.__lstTimeSteps = lstTimeSteps
+        self.__lstNumberOfAtoms = lstNumberOfAtoms
     def GetTimeSteps(self):
         return self.__lstTimeSteps
     def GetAtomNumbers(self):
@@ -202,6 +422,75 @@ class LAMMPSData(object):
         return self.__dctTimeSteps[str(self.__lstTimeSteps[intIndex])]
     def GetNumberOfDimensions(self)-> int:
         return self.__Dimensions 
+
+class LAMMPSLazyData(object): #same interface as LAMMPSData but only decodes a time step when it is requested
+    def __init__(self,strFilename: str, intLatticeType: int, fltLatticeParameter: float, objAnalysis: object, intCacheSize = 2, blnUseCache = True, lstColumns = None):
+        self.__FileName = strFilename
+        self.__Columns = lstColumns
+        self.__LatticeType = intLatticeType
+        self.__LatticeParameter = fltLatticeParameter
+        self.__Analysis = objAnalysis
+        self.__CacheSize = max(intCacheSize, 1)
+        self.__dctCache = OrderedDict()
+        self.__dctOffsets = dict()
+        self.__dctCacheHeaders = dict()
+        lstNumberOfAtoms = []
+        lstTimeSteps = []
+        self.__Dimensions = 3
+        if blnUseCache and IsDumpCacheCurrent(strFilename):
+            for dctHeader in ReadDumpCacheHeader(strFilename):
+                if len(dctHeader['Bounds']) == 2:
+                    self.__Dimensions = 2
+                lstTimeSteps.append(dctHeader['TimeStep'])
+                lstNumberOfAtoms.append(dctHeader['NumberOfAtoms'])
+                self.__dctCacheHeaders[str(dctHeader['TimeStep'])] = dctHeader
+        else:
+            with open(strFilename, 'rb') as Bfile:
+                Dfile = map(bytes.decode, Bfile) #binary mode so that tell() gives byte offsets
+                while True:
+                    intOffset = Bfile.tell()
+                    tupHeader = ReadDumpHeader(Dfile)
+                    if tupHeader is None:
+                        break
+                    timestep, N, lstBoundaryType, lstBounds, lstColumnNames = tupHeader
+                    intLines = sum(1 for _ in it.islice(Bfile, N))
+                    if intLines != N: #fails like LAMMPSData rather than returning the earlier time steps
+                        raise EOFError("Unexpected end of file after " + str(intLines) + " of " + str(N) + " atoms in time step " + str(timestep) + " of " + strFilename)
+                    if len(lstBounds) == 2:
+                        self.__Dimensions = 2
+                    lstTimeSteps.append(timestep)
+                    lstNumberOfAtoms.append(N)
+                    self.__dctOffsets[str(timestep)] = intOffset
+        self.__lstTimeSteps = lstTimeSteps
+        self.__lstNumberOfAtoms = lstNumberOfAtoms
+    def __ReadTimeStep(self, strTimeStep: str):
+        if strTimeStep in self.__dctCacheHeaders:
+            tupFrame = ReadDumpCacheFrame(self.__FileName, self.__dctCacheHeaders[strTimeStep], self.__Columns)
+            return MakeTimeStep(*tupFrame, self.__FileName, self.__LatticeType, self.__LatticeParameter, self.__Analysis)
+        with open(self.__FileName, 'rb') as Bfile:
+            Bfile.seek(self.__dctOffsets[strTimeStep])
+            Dfile = io.TextIOWrapper(Bfile)
+            objTimeStep = ReadDumpTimeStep(Dfile, self.__FileName, self.__LatticeType, self.__LatticeParameter, self.__Analysis, self.__Columns)
+            Dfile.detach()
+        return objTimeStep
+    def GetTimeSteps(self):
+        return self.__lstTimeSteps
+    def GetAtomNumbers(self):
+        return self.__lstNumberOfAtoms
+    def GetTimeStep(self, strTimeStep: str):
+        if strTimeStep in self.__dctCache:
+            self.__dctCache.move_to_end(strTimeStep)
+        else:
+            self.__dctCache[strTimeStep] = self.__ReadTimeStep(strTimeStep)
+            while len(self.__dctCache) > self.__CacheSize:
+                self.__dctCache.popitem(last=False)
+        return self.__dctCache[strTimeStep]
+    def GetTimeStepByIndex(self, intIndex : int):
+        return self.GetTimeStep(str(self.__lstTimeSteps[intIndex]))
+    def GetNumberOfDimensions(self)-> int:
+        return self.__Dimensions
+    def ClearCache(self):
+        self.__dctCache = OrderedDict()
               
 class LAMMPSTimeStep(object):
     def __init__(self,fltTimeStep: float,intNumberOfAtoms: int, lstColumnNames: list, lstBoundaryType: list, lstBounds: list):
@@ -214,6 +503,9 @@ class LAMMPSTimeStep(object):
         self.__AtomData = np.zeros([intNumberOfAtoms,self.__NumberOfColumns])
         self.__ColumnNames = lstColumnNames
         self.__ColumnTypes = []
+        self.__IDIndex = None #maps atom IDs to rows of __AtomData, the setters clear it when the IDs or rows change
+        self.__IndexedIDs = None #copy of the ID column the index was built from, compared once after GetAtomData() as it can be edited in place
+        self.__IDsChecked = False
         self.SetBoundBoxLabels(lstBoundaryType)
         self.SetBoundBoxDimensions(lstBounds)
     def DeleteColumnByIndex(self,intColumnIndex: int):
@@ -221,6 +513,7 @@ class LAMMPSTimeStep(object):
             self.__ColumnNames.pop(intColumnIndex)
             self.__ColumnTypes.pop(intColumnIndex)
             self.__AtomData = np.delete(self.__AtomData,intColumnIndex,1)
+            self.__IDIndex = None
     def DeleteColumnByName(self,strColumnName: str):
         if strColumnName in self.__ColumnNames:
             intColumnIndex = self.GetColumnIndex(strColumnName)
@@ -233,30 +526,81 @@ class LAMMPSTimeStep(object):
         return len(self.__ColumnNames)
     def SetColumnByIndex(self, arrColumn:np.array, intColumnIndex: int):
         self.__AtomData[:, intColumnIndex] = arrColumn
+        if intColumnIndex == 0:
+            self.__IDIndex = None
+    def __BuildIDIndex(self):
+        self.__IDsChecked = True
+        self.__IndexedIDs = np.copy(self.__AtomData[:,0])
+        arrIDs = self.__AtomData[:,0].astype('int64')
+        arrOrder = np.argsort(arrIDs, kind='stable')
+        arrSortedIDs = arrIDs[arrOrder]
+        if np.any(np.diff(arrSortedIDs) == 0): #repeated IDs so fall back to a full scan
+            self.__IDIndex = ('scan',)
+        elif len(arrIDs) > 0 and arrSortedIDs[0] >= 0 and arrSortedIDs[-1] <= 4*len(arrIDs) + 1000: #LAMMPS IDs are usually close to 1...N so a lookup table is cheap
+            arrIndex = -np.ones(arrSortedIDs[-1]+1, dtype='int64')
+            arrIndex[arrIDs] = np.arange(len(arrIDs))
+            self.__IDIndex = ('dense', arrIndex)
+        else:
+            self.__IDIndex = ('sorted', arrSortedIDs, arrOrder)
+    def GetRowIndicesByIDs(self, lstOfAtomIDs: list)->np.array: #rows are returned in ascending order, as with np.isin
+        if self.__IDIndex is None:
+            self.__BuildIDIndex()
+        elif not(self.__IDsChecked): #the array has been handed out since the last lookup
+            if np.array_equal(self.__IndexedIDs, self.__AtomData[:,0]):
+                self.__IDsChecked = True
+            else:
+                self.__BuildIDIndex()
+        if self.__IDIndex[0] == 'scan':
+            return np.where(np.isin(self.__AtomData[:,0], lstOfAtomIDs))[0]
+        arrIDs = np.asarray(lstOfAtomIDs).ravel()
+        arrIDs = arrIDs[np.round(arrIDs) == arrIDs].astype('int64')
+        if self.__IDIndex[0] == 'dense':
+            arrIndex = self.__IDIndex[1]
+            arrIDs = arrIDs[(arrIDs >= 0) & (arrIDs < len(arrIndex))]
+            arrRows = arrIndex[arrIDs]
+            arrRows = arrRows[arrRows >= 0]
+        else:
+            arrSortedIDs, arrOrder = self.__IDIndex[1:]
+            arrPositions = np.searchsorted(arrSortedIDs, arrIDs)
+            arrFound = arrPositions < len(arrSortedIDs)
+            arrFound[arrFound] = arrSortedIDs[arrPositions[arrFound]] == arrIDs[arrFound]
+            arrRows = arrOrder[arrPositions[arrFound]]
+        return np.unique(arrRows)
     def GetColumnByIDs(self,lstOfAtomIDs: list, intColumn: int):
-        return self.__AtomData[np.isin(self.__AtomData[:,0], lstOfAtomIDs), intColumn]     
+        return self.__AtomData[self.GetRowIndicesByIDs(lstOfAtomIDs), intColumn]     
     def SetColumnByIDs(self,lstOfAtomIDs: list, intColumn: int, arrValues: np.array):
-        self.__AtomData[np.isin(self.__AtomData[:,0], lstOfAtomIDs), intColumn] = arrValues
+        self.__AtomData[self.GetRowIndicesByIDs(lstOfAtomIDs), intColumn] = arrValues
+        if intColumn == 0:
+            self.__IDIndex = None
     def SetRow(self, intRowNumber: int, lstRow: list):
         self.__AtomData[intRowNumber] = lstRow
+        self.__IDIndex = None
     def AddColumn(self, arrColumn: np.array, strColumnName: str, strFormat = '%s'):
         if strColumnName not in self.__ColumnNames:
             self.__AtomData = np.append(self.__AtomData, arrColumn, axis=1)
             self.__ColumnNames.append(strColumnName)
             self.__ColumnTypes += ' ' + strFormat
+            self.__IDIndex = None
     def SetColumnToZero(self, strColumnName: str):
         arrColumn = np.zeros(self.GetNumberOfAtoms())
         intColumnIndex = self.GetColumnIndex(strColumnName)
         self.__AtomData[:,intColumnIndex] = arrColumn
+        if intColumnIndex == 0:
+            self.__IDIndex = None
     def GetRow(self,intRowNumber: int):
+        self.__IDsChecked = False
         return self.__AtomData[intRowNumber]
     def GetRows(self, lstOfRows: list):
         return self.__AtomData[lstOfRows,:]
     def GetAtomsByID(self, lstOfAtomIDs: list, intAtomColumn = 0):
+        if intAtomColumn == 0:
+            return self.__AtomData[self.GetRowIndicesByIDs(lstOfAtomIDs)]
         return self.__AtomData[np.isin(self.__AtomData[:,intAtomColumn],lstOfAtomIDs)]
     def SetAtomData(self, inArray:np.array):
         self.__AtomData= inArray
+        self.__IDIndex = None
     def GetAtomData(self):
+        self.__IDsChecked = False
         return self.__AtomData
     def SetColumnNames(self, lstColumnNames):
         self.__ColumnNames = lstColumnNames
@@ -265,6 +609,8 @@ class LAMMPSTimeStep(object):
     def GetColumnNames(self): 
         return self.__ColumnNames
     def GetColumnByIndex(self, intStructureIndex: int):
+        if intStructureIndex == 0:
+            self.__IDsChecked = False
         return self.__AtomData[:,intStructureIndex]
     def GetColumnByName(self, strColumnName: str):
         if self.__ColumnNames != []:
@@ -352,7 +698,7 @@ class LAMMPSTimeStep(object):
     def PeriodicMinimumDistance(self, inVector1: np.array, inVector2: np.array)->float:
         return gf.PeriodicMinimumDistance(inVector1, inVector2, self.__CellVectors, self.__BasisConversion, self.__BoundaryTypes)
     def StandardiseOrientationData(self):
-        self.__AtomData[:, [self.GetColumnNames().index('OrientationX'),self.GetColumnNames().index('OrientationY'),self.GetColumnNames().index('OrientationZ'), self.GetColumnNames().index('OrientationW')]]=np.apply_along_axis(gf.FCCQuaternionEquivalence,1,self.GetOrientationData()) 
+        self.__AtomData[:, [self.GetColumnNames().index('OrientationX'),self.GetColumnNames().index('OrientationY'),self.GetColumnNames().index('OrientationZ'), self.GetColumnNames().index('OrientationW')]]=gf.FCCQuaternionEquivalences(self.GetOrientationData())
     def GetOrientationData(self)->np.array:
         return (self.__AtomData[:, [self.GetColumnNames().index('OrientationX'),self.GetColumnNames().index('OrientationY'),self.GetColumnNames().index('OrientationZ'), self.GetColumnNames().index('OrientationW')]])  
     def GetData(self, inDimensions: np.array, lstOfColumns):
@@ -652,6 +998,7 @@ class LAMMPSAnalysis3D(LAMMPSPostProcess):
         self.__JunctionMesh = []
         self.__GrainBoundaryMesh = []
         self.__GBSeparation = 0 
+        self.__blnPeriodicGrains = False #True when PartitionGrains used a periodic method so MergePeriodicGrains has nothing to do
         self.blnPEAssigned = False
         self.blnVolumeAssigned = False
         self.blnAdjustedMeshPointsAssigned = False
@@ -659,6 +1006,20 @@ class LAMMPSAnalysis3D(LAMMPSPostProcess):
         self.intGrainBoundary = -1
         self.__objRealCell = gl.RealCell(ld.GetCellNodes(str(intLatticeType)),fltLatticeParameter*np.ones(3))
         self.__MaxGBWidth = 0
+        self.__FrameWrapper = None #one periodic wrapper for the whole frame which the grain, GB and TJ trees all mask
+        self.__FrameWrapperPositions = None
+    def GetFrameWrapper(self, fltWrapperWidth = 25):
+        arrPositions = self.GetAtomData()[:,1:4]
+        if self.__FrameWrapper is None or fltWrapperWidth > self.__FrameWrapper.GetWrapperLength() or not(np.array_equal(arrPositions, self.__FrameWrapperPositions)):
+            fltWidth = max(fltWrapperWidth, 25)
+            if self.__FrameWrapper is not None:
+                fltWidth = max(fltWidth, self.__FrameWrapper.GetWrapperLength())
+            self.__FrameWrapper = gf.PeriodicFrameWrapper(arrPositions,self.GetCellVectors(),gf.FindConstraintsFromBasisVectors(self.GetCellVectors()),fltWidth,self.GetPeriodicDirections())
+            self.__FrameWrapperPositions = np.copy(arrPositions)
+        return self.__FrameWrapper
+    def MakePeriodicSubset(self, inIDs, fltWrapperWidth: float):
+        arrRows = self.GetRowIndicesByIDs(inIDs)
+        return self.GetFrameWrapper(fltWrapperWidth).GetSubset(arrRows, fltWrapperWidth)
     def GetMaxGBWidth(self):
         return self.__MaxGBWidth
     def SetMaxGBWidth(self, fltWidth):
@@ -670,6 +1031,23 @@ class LAMMPSAnalysis3D(LAMMPSPostProcess):
         arrPositions = np.where(arrRow == intValue)
         arrIDs = self.GetAtomData()[arrPositions,0]
         return arrIDs[0]
+    def FindEcoOrientOrderParameters(self, arrPrimitive1: np.array, arrPrimitive2: np.array, fltCutOff: float, fltTolerance: float, strColumnName = None):
+        #ECO order parameter of every atom from its neighbours within fltCutOff, in atom row order. fltCutOff should be less than half the
+        #cell width so each neighbour pair has one periodic image. If strColumnName is given the values are also stored as a column.
+        arrPositions = self.GetAtomData()[:,1:4]
+        arrCellVectors = self.GetCellVectors()
+        arrPairs = gf.CellList(arrPositions,arrCellVectors,fltCutOff,self.GetPeriodicDirections()).Pquery_pairs()[0]
+        arrFractional = np.matmul(arrPositions[arrPairs[:,1]]-arrPositions[arrPairs[:,0]], np.linalg.inv(arrCellVectors))
+        arrPeriodic = np.array(list(map(lambda x: x == 'p', self.GetPeriodicDirections())))
+        arrFractional[:,arrPeriodic] -= np.round(arrFractional[:,arrPeriodic])
+        arrVectors = np.matmul(arrFractional, arrCellVectors)
+        objOrient = gf.EcoOrient(fltCutOff, fltTolerance)
+        arrValues = objOrient.GetOrderParametersFromPairs(np.append(arrPairs[:,0],arrPairs[:,1]),np.append(arrVectors,-arrVectors,axis=0),self.GetNumberOfAtoms(),arrPrimitive1,arrPrimitive2)
+        if strColumnName is not None:
+            if strColumnName not in self.GetColumnNames():
+                self.AddColumn(np.zeros([self.GetNumberOfAtoms(),1]),strColumnName)
+            self.GetAtomData()[:,self.GetColumnIndex(strColumnName)] = arrValues
+        return arrValues
     def GetUnassignedGrainAtomIDs(self):
         if 'GrainNumber' not in self.GetColumnNames():
             warnings.warn('Grain labels not set.')
@@ -682,9 +1060,10 @@ class LAMMPSAnalysis3D(LAMMPSPostProcess):
         if arrIDs is None:
             arrIDs = np.array(self.GetPTMAtomIDs())
         arrGrainAtoms = self.GetAtomsByID(arrIDs)[:,1:4] 
+        arrAtomRows = self.GetRowIndicesByIDs(arrIDs)
         arrUsedRows = np.array(list(range(len(arrIDs))))
         for i in range(intN):
-            objGrainTree = gf.PeriodicWrapperKDTree(arrGrainAtoms,self.GetCellVectors(),gf.FindConstraintsFromBasisVectors(self.GetCellVectors()),2*self.__LatticeParameter,self.GetPeriodicDirections())
+            objGrainTree = self.GetFrameWrapper(2*self.__LatticeParameter).GetSubset(arrAtomRows[arrUsedRows],2*self.__LatticeParameter)
             arrDistances1,arrIndices1 =objGrainTree.Pquery(arrGrainAtoms,k = self.__objRealCell.GetNumberOfNeighbours()+1)
             arrIndices1 = mf.FlattenList(arrIndices1)
             arrIndices1= objGrainTree.GetPeriodicIndices(arrIndices1)
@@ -719,7 +1098,7 @@ class LAMMPSAnalysis3D(LAMMPSPostProcess):
         for k in range(len(lstNewLabels)):
             self.SetColumnByIDs(lstAllIDs[k], self.GetColumnIndex('GrainNumber'),lstNewLabels[k]*np.ones(len(lstAllIDs[k])))
         for g in lstCurrentLabels:
-            self.__PeriodicGrains[g] = gf.PeriodicWrapperKDTree(self.GetAtomsByID(self.GetGrainAtomIDs(g))[:,1:4],self.GetCellVectors(),gf.FindConstraintsFromBasisVectors(self.GetCellVectors()),25)
+            self.__PeriodicGrains[g] = self.MakePeriodicSubset(self.GetGrainAtomIDs(g),25)
     def FindPEPerVolume(self, lstIDs=None):
         if lstIDs is None:
             return self.GetColumnByName('c_pe1')/self.GetColumnByName('c_v[1]')
@@ -734,12 +1113,25 @@ class LAMMPSAnalysis3D(LAMMPSPostProcess):
         else:
             intCol = self.GetColumnIndex('GrainNumber')
             self.SetColumnByIndex(np.zeros(self.GetNumberOfAtoms()),intCol)
-    def PartitionGrains(self, intN: int,intMinGrainSize = 25, fltWrapperWidth = 25):
+    def PartitionGrains(self, intN: int,intMinGrainSize = 25, fltWrapperWidth = 25, strMethod = 'position', fltMaxAngle = np.pi/36):
+        #strMethod 'position' labels the grain atoms with DBSCAN's rules on minimum image distances and 'orientation' joins periodic
+        #neighbours whose PTM disorientation is below fltMaxAngle (radians). Both give grains which already span the periodic boundaries.
+        #'dbscan' is the original clustering of the unwrapped positions which needs MergePeriodicGrains afterwards. Border atoms within
+        #range of two grains can be labelled differently by 'dbscan' and 'position'.
         arrIDs = self.FindGrainAtomIDs(intN)
+        self.__blnPeriodicGrains = (strMethod != 'dbscan')
         if len(arrIDs) > 0:
-            arrPoints = self.GetAtomsByID(arrIDs)[:,1:4]
-            clustering = DBSCAN(eps=1.05*self.__GBSeparation).fit(arrPoints)
-            arrLabels = clustering.labels_
+            if strMethod == 'position':
+                arrPoints = self.GetAtomsByID(arrIDs)[:,1:4]
+                arrLabels = gf.PeriodicRadiusLabels(arrPoints, self.GetCellVectors(), 1.05*self.__GBSeparation, self.GetPeriodicDirections())
+            elif strMethod == 'dbscan':
+                arrPoints = self.GetAtomsByID(arrIDs)[:,1:4]
+                clustering = DBSCAN(eps=1.05*self.__GBSeparation).fit(arrPoints)
+                arrLabels = clustering.labels_
+            elif strMethod == 'orientation':
+                arrLabels = self.FindOrientationClusters(arrIDs, 1.05*self.__GBSeparation, fltMaxAngle)
+            else:
+                raise ValueError('Unknown grain partition method ' + str(strMethod))
             arrUniqueLabels,arrCounts = np.unique(arrLabels,return_counts=True)
             if 'GrainNumber' not in self.GetColumnNames():
                 self.AddColumn(np.zeros([self.GetNumberOfAtoms(),1]),'GrainNumber',strFormat='%i')
@@ -752,13 +1144,28 @@ class LAMMPSAnalysis3D(LAMMPSPostProcess):
                     self.SetColumnByIDs(arrCurrentIDs,self.GetColumnIndex('GrainNumber'),(intMax+1)*np.ones(len(arrCurrentIDs)))
             self.__GrainLabels = self.GetGrainLabels()
             for k in self.__GrainLabels:
-                self.__PeriodicGrains[k] = gf.PeriodicWrapperKDTree(self.GetAtomsByID(self.GetGrainAtomIDs(k))[:,1:4],self.GetCellVectors(),gf.FindConstraintsFromBasisVectors(self.GetCellVectors()),fltWrapperWidth,self.GetPeriodicDirections())
+                self.__PeriodicGrains[k] = self.MakePeriodicSubset(self.GetGrainAtomIDs(k),fltWrapperWidth)
         else:
             self.__GrainLabels = []
+    def FindOrientationClusters(self, arrIDs: np.array, fltCutOff: float, fltMaxAngle: float)->np.array: #connected component label of each atom ID
+        intFirst = self.GetColumnIndex('c_pt[1]')
+        arrRows = self.GetRowIndicesByIDs(arrIDs)
+        arrPTM = self.GetAtomData()[arrRows][:,intFirst:intFirst+7]
+        arrTypes = arrPTM[:,0].astype('int')
+        arrPairs = gf.CellList(self.GetAtomData()[arrRows,1:4],self.GetCellVectors(),fltCutOff,self.GetPeriodicDirections()).Pquery_pairs()[0]
+        arrPairs = arrPairs[arrTypes[arrPairs[:,0]] == arrTypes[arrPairs[:,1]]]
+        arrAngles = np.zeros(len(arrPairs))
+        for intType in np.unique(arrTypes[arrPairs[:,0]]):
+            if intType == 2: #ptm structure type 2 is hcp
+                strSymmetry = 'hcp'
+            else:
+                strSymmetry = 'cubic'
+            arrTypeRows = np.where(arrTypes[arrPairs[:,0]] == intType)[0]
+            arrAngles[arrTypeRows] = gf.PairDisorientations(arrPTM[arrPairs[arrTypeRows,0],3:7], arrPTM[arrPairs[arrTypeRows,1],3:7], strSymmetry)
+        return gf.PairLabels(arrPairs[arrAngles < fltMaxAngle], len(arrRows))
     def SetPeriodicGrain(self, strName: str, arrIDs: np.array, fltWrapperWidth: float):
         arrOriginalIDs = arrIDs
-        arrPoints = self.GetAtomsByID(arrIDs)[:,1:4]
-        self.__PeriodicGrains[strName] = gf.PeriodicWrapperKDTree(arrPoints,self.GetCellVectors(),gf.FindConstraintsFromBasisVectors(self.GetCellVectors()),fltWrapperWidth,self.GetPeriodicDirections())
+        self.__PeriodicGrains[strName] = self.MakePeriodicSubset(arrIDs,fltWrapperWidth)
         #arrRows = []
         # if strName != 0:
         #     fltDistance = 1.05*self.GetRealCell().GetNearestNeighbourDistance()
@@ -782,7 +1189,12 @@ class LAMMPSAnalysis3D(LAMMPSPostProcess):
         #     return lstRows
         # else:
         #     return []  
+    def ArePeriodicGrains(self)->bool:
+        return self.__blnPeriodicGrains
     def MergePeriodicGrains(self, intCloseAtoms = 5):
+        if self.__blnPeriodicGrains:
+            warnings.warn('MergePeriodicGrains skipped as PartitionGrains has already joined the grains across the periodic boundaries')
+            return
         i = 0
         fltGBScale = 1.1
         lstKeys = self.GetGrainLabels()
@@ -848,9 +1260,8 @@ class LAMMPSAnalysis3D(LAMMPSPostProcess):
                 fltWrapper = self.__PeriodicGrains[h].GetWrapperLength()
                 del self.__PeriodicGrains[h]
             lstGrainIDs = np.unique(lstGrainIDs).tolist()
-            arrPoints = self.GetAtomsByID(lstGrainIDs)[:,1:4]
             self.AppendGrainNumbers(intGrainNumber*np.ones(len(lstGrainIDs)),lstGrainIDs)
-            self.__PeriodicGrains[intGrainNumber] = gf.PeriodicWrapperKDTree(arrPoints,self.GetCellVectors(),gf.FindConstraintsFromBasisVectors(self.GetCellVectors()),fltWrapper,self.GetPeriodicDirections())
+            self.__PeriodicGrains[intGrainNumber] = self.MakePeriodicSubset(lstGrainIDs,fltWrapper)
         n = 1
         lstGrainLabels = self.GetGrainLabels()
         if 0 in lstGrainLabels:
@@ -859,7 +1270,7 @@ class LAMMPSAnalysis3D(LAMMPSPostProcess):
         for l in lstGrainLabels:
             if l != n:
                 self.AppendGrainNumbers(n*np.ones(len(self.GetGrainAtomIDs(l))),self.GetGrainAtomIDs(l))
-                self.__PeriodicGrains[n] = gf.PeriodicWrapperKDTree(self.__PeriodicGrains[l].GetOriginalPoints(),self.GetCellVectors(),gf.FindConstraintsFromBasisVectors(self.GetCellVectors()),self.__PeriodicGrains[l].GetWrapperLength(),self.GetPeriodicDirections())
+                self.__PeriodicGrains[n] = self.MakePeriodicSubset(self.GetGrainAtomIDs(n),self.__PeriodicGrains[l].GetWrapperLength())
                 #self.__PeriodicGrains.pop(l)
                 del self.__PeriodicGrains[l]               
             n +=1 
@@ -981,7 +1392,7 @@ class LAMMPSAnalysis3D(LAMMPSPostProcess):
                 lstGBIDs = np.unique(lstGBIDs).tolist()
                 self.SetColumnByIDs(lstGBIDs,intGBCol, (l+1)*np.ones(len(lstGBIDs)))
                 lstGBIDs = self.GetGBAtomIDs(l+1)
-                self.__PeriodicGrainBoundaries[l+1] = gf.PeriodicWrapperKDTree(self.GetAtomsByID(lstGBIDs)[:,1:4],self.GetCellVectors(), gf.FindConstraintsFromBasisVectors(self.GetCellVectors()),fltGBWidth,self.GetPeriodicDirections())
+                self.__PeriodicGrainBoundaries[l+1] = self.MakePeriodicSubset(lstGBIDs,fltGBWidth)
         self.SetColumnByIDs(arrDuplicates, intGBCol, -1*np.ones(len(arrDuplicates))) #remove any duplicate GBs which may leave a small gap around the triple oine  
         return lstAllGBMesh #returns the mesh points for plotting              
     def FindJunctionLines(self, fltRadius, intOrder, fltSearchRadius = None):
@@ -994,16 +1405,19 @@ class LAMMPSAnalysis3D(LAMMPSPostProcess):
         lstAllTJs= []
         lstMergedPoints = self.FindJunctionMesh(fltRadius,intOrder)
         self.__JunctionMesh = lstMergedPoints
+        lstGrainBoundaries = self.GetGrainBoundaryLabels()
+        lstGrainBoundaries.remove(0)
+        dctGBTrees = dict() #the GB labels do not change inside the mesh loop so each GB tree is only made once
+        for l in lstGrainBoundaries:
+            arrIDs1 = self.GetGBAtomIDs(l)
+            dctGBTrees[l] = (arrIDs1, self.MakePeriodicSubset(arrIDs1,fltSearchRadius))
         for m in lstMergedPoints:
            # blnTJ = False
             lstAllIDs = []
-            lstGrainBoundaries = self.GetGrainBoundaryLabels()
-            lstGrainBoundaries.remove(0)
             lstTemp = []
             intTJ = 0
             for l in lstGrainBoundaries:
-                arrIDs1 = self.GetGBAtomIDs(l)
-                objTree = gf.PeriodicWrapperKDTree(self.GetAtomsByID(arrIDs1)[:,1:4],self.GetCellVectors(),gf.FindConstraintsFromBasisVectors(self.GetCellVectors()),fltSearchRadius, self.GetPeriodicDirections())
+                arrIDs1, objTree = dctGBTrees[l]
                 arrIndices1, arrDistances = objTree.Pquery_radius(m, fltRadius)
                 arrIndices1 = np.unique(mf.FlattenList(arrIndices1))
                 if len(arrIndices1)> 0:
@@ -1225,19 +1639,18 @@ class LAMMPSAnalysis3D(LAMMPSPostProcess):
     def GetGBAtomIDs(self, intGBNumber):
         lstGBAtoms = list(np.where(self.GetColumnByName('GrainBoundary').astype('int') == intGBNumber)[0])
         return self.GetAtomData()[lstGBAtoms,0].astype('int')
-    def GetAtomIDsByOrientation(self,inQuaternion: np.array, intLatticeType: int,fltTolerance = 0.001):
-        lstRows = []
+    def GetAtomIDsByOrientation(self,inQuaternion: np.array, intLatticeType: int,fltTolerance = 0.001, strSymmetry = None):
         intFirst = self.GetColumnIndex('c_pt[1]')
         intSecond = self.GetColumnIndex('c_pt[7]')
         arrQuaternions = self.GetAtomData()[:,intFirst:intSecond+1]
-        #arrRows = np.matmul(arrQuaternions[:,1:5], inQuaternion)
-        #lstRows.append(np.where((np.abs(arrRows) > 1- fltTolerance) & (arrQuaternions[:,0].astype('int') == intLatticeType))[0])
-        for j in gf.CubicQuaternions():
-            y = gf.QuaternionProduct(inQuaternion,j)
-            #y = gf.QuaternionProduct(j,inQuaternion)
-            arrRows = np.matmul(arrQuaternions[:,1:5], y)
-            lstRows.append(np.where((np.abs(arrRows) > 1-fltTolerance) & (arrQuaternions[:,0].astype('int') == intLatticeType))[0])
-        arrRows2 = np.unique(np.concatenate(lstRows))
+        if strSymmetry is None:
+            if intLatticeType == 2: #ptm structure type 2 is hcp
+                strSymmetry = 'hcp'
+            else:
+                strSymmetry = 'cubic'
+        arrLattice = np.where(arrQuaternions[:,0].astype('int') == intLatticeType)[0]
+        arrAngles = gf.QuaternionDisorientations(arrQuaternions[arrLattice,3:7], inQuaternion, strSymmetry) #c_pt[4] to c_pt[7] after the type, rmsd and interatomic distance
+        arrRows2 = arrLattice[arrAngles < 2*np.arccos(1-fltTolerance)] #same as |q.(r s)| > 1 - fltTolerance for some symmetry s
         rtnValue = []
         if len(arrRows2) > 0:
             arrIDs = self.GetColumnByIndex(0)[arrRows2].astype('int')
@@ -1297,7 +1710,10 @@ class LAMMPSGlobal(LAMMPSAnalysis3D): #includes file writing and reading to corr
         self.MakeGrainTrees()
         self.SetJunctionLineIDs()
         self.SetGrainBoundaryIDs()
-    def WriteDefectData(self, strFileName: str):
+    def WriteDefectData(self, strFileName: str): #the text format, or a defect store if the name ends in .dfz. gl.DefectObject.ImportData reads either
+        if strFileName.endswith(gl.strDefectStoreExtension):
+            gl.WriteDefectStore(strFileName, self, self.blnVolumeAssigned, self.blnPEAssigned, self.blnAdjustedMeshPointsAssigned)
+            return
         with open(strFileName, 'w') as fdata:
             fdata.write('Time Step \n')
             fdata.write('{} \n'.format(self.GetTimeStep()))
@@ -1354,15 +1770,25 @@ class LAMMPSGlobal(LAMMPSAnalysis3D): #includes file writing and reading to corr
             fdata.close()
 
 class LAMMPSCorrelate(object): #add grain boundaries and junction lines over different steps using dfc files
-    def __init__(self):
+    def __init__(self, intCandidates = 4, fltMaxCentroidDistance = None, fltMaxHausdorffDistance = None):
         self.__dctDefects = dict()
         self.__GlobalJunctionLines = dict()
         self.__GlobalGrainBoundaries = dict()
         self.__CellVectors = gf.StandardBasisVectors(3)
         self.__BasisConversion = gf.StandardBasisVectors(3)
         self.__BoundaryTypes = ['pp','pp','pp']
+        self.__Candidates = intCandidates #Hausdorff distances are only found for this many nearest centroids of each defect, None for all pairs
+        self.__MaxCentroidDistance = fltMaxCentroidDistance
+        self.__MaxHausdorffDistance = fltMaxHausdorffDistance #defects further than this from all others are births or deaths
+        self.__MaxIDs = {'GB': -1, 'JL': -1} #largest global ID given so far so a new defect never reuses one
+        self.__dctMeshTrees = dict() #time step -> {id(mesh object): (mesh object, KD-tree, centroid)} kept for the latest time steps
     def AddDefectObject(self, objDefect: gl.DefectObject):
         self.__dctDefects[objDefect.GetTimeStep()] = objDefect
+        self.__UpdateMaxIDs(objDefect)
+    def __UpdateMaxIDs(self, objDefect: gl.DefectObject):
+        for strKind, lstIDs in [('GB', objDefect.GetGrainBoundaryIDs()), ('JL', objDefect.GetJunctionLineIDs())]:
+            if len(lstIDs) > 0:
+                self.__MaxIDs[strKind] = max(self.__MaxIDs[strKind], max(lstIDs))
     def GetDefectObject(self, fltTimeStep):
         return self.__dctDefects[fltTimeStep]
     def GetTimeSteps(self):
@@ -1379,81 +1805,103 @@ class LAMMPSCorrelate(object): #add grain boundaries and junction lines over dif
             objDefect.GetJunctionLine(j).SetID(j)
             objDefect.AddJunctionLine(objDefect.GetJunctionLine(j))
         self.__dctDefects[objDefect.GetTimeStep()] = objDefect    
-        if len(list(self.__dctDefects.keys())) > 1 and blnCorrelateDefects:
-            intLastTimeStep = self.GetTimeSteps()[-1]
-            self.CorrelateDefects(objDefect.GetTimeStep(), intLastTimeStep)
+        lstTimeSteps = self.GetTimeSteps()
+        intPosition = lstTimeSteps.index(objDefect.GetTimeStep())
+        if intPosition > 0 and blnCorrelateDefects: #correlated with the time step before it
+            self.CorrelateDefects(objDefect.GetTimeStep(), lstTimeSteps[intPosition-1])
+        else:
+            self.__UpdateMaxIDs(objDefect)
+    def GetMeshTree(self, intTimeStep, objMesh): #KD-tree and centroid of a mesh, found once and reused when the next time step is correlated
+        dctTrees = self.__dctMeshTrees.setdefault(intTimeStep, dict())
+        if id(objMesh) not in dctTrees:
+            arrPoints = np.reshape(objMesh.GetMeshPoints(), (-1,3))
+            dctTrees[id(objMesh)] = (objMesh, spatial.cKDTree(arrPoints), np.mean(arrPoints, axis=0))
+        return dctTrees[id(objMesh)][1:]
+    def MatchDefects(self, lstCurrentTrees: list, lstPreviousTrees: list):
+        #optimal assignment of current to previous defects by periodic Hausdorff distance. Each list holds (KD-tree, centroid) pairs.
+        #Returns the matched current and previous positions.
+        intCurrent = len(lstCurrentTrees)
+        intPrevious = len(lstPreviousTrees)
+        if intCurrent == 0 or intPrevious == 0:
+            return np.zeros(0,dtype='int'), np.zeros(0,dtype='int')
+        arrCurrentCentroids = np.vstack(list(map(lambda x: x[1], lstCurrentTrees)))
+        arrPreviousCentroids = np.vstack(list(map(lambda x: x[1], lstPreviousTrees)))
+        arrRows, arrCols = np.meshgrid(np.arange(intCurrent), np.arange(intPrevious), indexing='ij')
+        arrRows = arrRows.ravel()
+        arrCols = arrCols.ravel()
+        arrCentroidDistances, arrShortest, arrShifts = gf.PeriodicEquivalentMovements(arrCurrentCentroids[arrRows], arrPreviousCentroids[arrCols], self.__CellVectors, self.__BasisConversion, self.__BoundaryTypes)
+        arrCentroidDistances = np.reshape(arrCentroidDistances, (intCurrent, intPrevious))
+        arrCandidates = np.ones([intCurrent, intPrevious], dtype='bool')
+        if self.__Candidates is not None and self.__Candidates < max(intCurrent, intPrevious): #nearest previous centroids of each current
+            arrCandidates[:] = False #defect, then nearest current centroids of any previous defect which has no candidate
+            intRow = min(self.__Candidates, intPrevious)
+            intCol = min(self.__Candidates, intCurrent)
+            arrCandidates[np.arange(intCurrent)[:,np.newaxis], np.argpartition(arrCentroidDistances, intRow-1, axis=1)[:,:intRow]] = True
+            arrMissing = np.where(~np.any(arrCandidates, axis=0))[0]
+            if len(arrMissing) > 0:
+                arrCandidates[np.argpartition(arrCentroidDistances[:,arrMissing], intCol-1, axis=0)[:intCol,:], arrMissing[np.newaxis,:]] = True
+        if self.__MaxCentroidDistance is not None:
+            arrCandidates = arrCandidates & (arrCentroidDistances <= self.__MaxCentroidDistance)
+        arrHausdorff = np.full([intCurrent, intPrevious], np.inf)
+        for k in np.where(arrCandidates.ravel())[0]: #the previous mesh is moved by the periodic part of the centroid movement as before
+            objCurrentTree = lstCurrentTrees[arrRows[k]][0]
+            objPreviousTree = lstPreviousTrees[arrCols[k]][0]
+            fltForward = np.max(objPreviousTree.query(objCurrentTree.data + arrShifts[k])[0])
+            fltBackward = np.max(objCurrentTree.query(objPreviousTree.data - arrShifts[k])[0])
+            arrHausdorff[arrRows[k], arrCols[k]] = max(fltForward, fltBackward) #Hausdorff distance is not symmetric in general and so choose the larger of the two measure.
+        arrAllowed = np.isfinite(arrHausdorff)
+        if self.__MaxHausdorffDistance is not None:
+            arrAllowed = arrAllowed & (arrHausdorff <= self.__MaxHausdorffDistance)
+        if not(np.any(arrAllowed)):
+            return np.zeros(0,dtype='int'), np.zeros(0,dtype='int')
+        fltPenalty = 2*np.sum(arrHausdorff[arrAllowed]) + 1 #costs more than any assignment using only allowed pairs
+        arrCost = np.where(arrAllowed, arrHausdorff, fltPenalty)
+        arrMatchedRows, arrMatchedCols = optimize.linear_sum_assignment(arrCost)
+        arrKeep = arrAllowed[arrMatchedRows, arrMatchedCols]
+        return arrMatchedRows[arrKeep], arrMatchedCols[arrKeep]
     def CorrelateDefects(self,intTimeStep: int,intLastTimeStep: int):
         objDefect = self.__dctDefects[intTimeStep]
         objPreviousDefect = self.__dctDefects[intLastTimeStep]
-        lstGB = []
-        lstCurrentGBIDs = objDefect.GetGrainBoundaryIDs()
-        for j in lstCurrentGBIDs:
-            lstGB.append(objDefect.GetGrainBoundary(j).GetMeshPoints())
-        lstPreviousGB = []
-        lstPreviousGBIDs = objPreviousDefect.GetGrainBoundaryIDs()    
-        for k in lstPreviousGBIDs:
-            lstPreviousGB.append(objPreviousDefect.GetGrainBoundary(k).GetMeshPoints())
-        arrHausdorff = self.MakeHausdorffDistanceMatrix(lstGB, lstPreviousGB) #periodic Hausdroff distance used to match global defects
-        if len(lstPreviousGBIDs) != len(lstCurrentGBIDs):
-                warnings.warn('Number of grain boundaries changed from ' + str(len(lstPreviousGBIDs)) + ' to ' + str(len(lstCurrentGBIDs)) 
-                + ' at time step ' + str(intTimeStep)) 
-        while (len(lstCurrentGBIDs) > 0 and len(lstPreviousGBIDs) > 0):
-            tupCurrentPrevious = np.unravel_index(arrHausdorff.argmin(), arrHausdorff.shape)
-            intCurrent = int(tupCurrentPrevious[0])
-            intPrevious = int(tupCurrentPrevious[1])
-            objDefect.GetGrainBoundary(lstCurrentGBIDs[intCurrent]).SetID(lstPreviousGBIDs[intPrevious])
-            del lstCurrentGBIDs[intCurrent]
-            del lstPreviousGBIDs[intPrevious]
-            arrHausdorff = np.delete(arrHausdorff, intCurrent, axis = 0)
-            arrHausdorff = np.delete(arrHausdorff, intPrevious, axis = 1)
-        while len(lstCurrentGBIDs) > 0: #there are more current GBs than previous GBs
-            intID = lstCurrentGBIDs.pop(0)
-            if len(objDefect.GetGrainBoundaryIDs()) > 0:
-                intLastGlobalID = max(objDefect.GetGrainBoundaryIDs())
+        self.__UpdateMaxIDs(objPreviousDefect)
+        for strKind in ['GB', 'JL']:
+            if strKind == 'GB':
+                strName = 'grain boundaries'
+                lstCurrentIDs = objDefect.GetGrainBoundaryIDs()
+                lstPreviousIDs = objPreviousDefect.GetGrainBoundaryIDs()
+                lstCurrent = list(map(objDefect.GetGrainBoundary, lstCurrentIDs))
+                lstPrevious = list(map(objPreviousDefect.GetGrainBoundary, lstPreviousIDs))
             else:
-                intLastGlobalID = 0
-            objDefect.GetGrainBoundary(intID).SetID(intLastGlobalID + 1)
-        lstJL = []
-        lstCurrentJLIDs = objDefect.GetJunctionLineIDs()
-        for l in lstCurrentJLIDs:
-            lstJL.append(objDefect.GetJunctionLine(l).GetMeshPoints())
-        lstPreviousJL = []
-        lstPreviousJLIDs = objPreviousDefect.GetJunctionLineIDs()
-        for m in lstPreviousJLIDs:
-            lstPreviousJL.append(objPreviousDefect.GetJunctionLine(m).GetMeshPoints())
-        arrHausdorff = self.MakeHausdorffDistanceMatrix(lstJL, lstPreviousJL) #periodic Hausdroff distance used to match global defects
-        if len(lstPreviousJLIDs) != len(lstCurrentJLIDs):
-                warnings.warn('Number of junction lines changed from ' + str(len(lstPreviousJLIDs)) + ' to ' + str(len(lstCurrentJLIDs)) 
+                strName = 'junction lines'
+                lstCurrentIDs = objDefect.GetJunctionLineIDs()
+                lstPreviousIDs = objPreviousDefect.GetJunctionLineIDs()
+                lstCurrent = list(map(objDefect.GetJunctionLine, lstCurrentIDs))
+                lstPrevious = list(map(objPreviousDefect.GetJunctionLine, lstPreviousIDs))
+            if len(lstPreviousIDs) != len(lstCurrentIDs):
+                warnings.warn('Number of ' + strName + ' changed from ' + str(len(lstPreviousIDs)) + ' to ' + str(len(lstCurrentIDs)) 
                 + ' at time step ' + str(intTimeStep)) 
-        while (len(lstCurrentJLIDs) > 0 and len(lstPreviousJLIDs) > 0):
-            tupCurrentPrevious = np.unravel_index(arrHausdorff.argmin(), arrHausdorff.shape)
-            intCurrent = int(tupCurrentPrevious[0])
-            intPrevious = int(tupCurrentPrevious[1])
-            objDefect.GetJunctionLine(lstCurrentJLIDs[intCurrent]).SetID(lstPreviousJLIDs[intPrevious])
-            del lstCurrentJLIDs[intCurrent]
-            del lstPreviousJLIDs[intPrevious]
-            arrHausdorff = np.delete(arrHausdorff, intCurrent, axis = 0)
-            arrHausdorff = np.delete(arrHausdorff, intPrevious, axis = 1)
-        while len(lstCurrentJLIDs) > 0: #there are more current GBs than previous GBs
-            intID = lstCurrentJLIDs.pop(0)
-            if len(objDefect.GetJunctionLineIDs()) > 0:
-                intLastGlobalID = max(objDefect.GetJunctionLineIDs())
-            else:
-                intLastGlobalID = 0
-            objDefect.GetJunctionLine(intID).SetID(intLastGlobalID + 1)
+            arrMatchedRows, arrMatchedCols = self.MatchDefects(list(map(lambda x: self.GetMeshTree(intTimeStep, x), lstCurrent)), list(map(lambda x: self.GetMeshTree(intLastTimeStep, x), lstPrevious)))
+            for intRow, intCol in zip(arrMatchedRows, arrMatchedCols):
+                lstCurrent[intRow].SetID(lstPreviousIDs[intCol])
+            for intRow in sorted(set(range(len(lstCurrent))).difference(arrMatchedRows.tolist())): #new defects take IDs never used before
+                self.__MaxIDs[strKind] += 1
+                lstCurrent[intRow].SetID(self.__MaxIDs[strKind])
         objUpdatedDefect = gl.DefectObject(objDefect.GetTimeStep())
         for n in objDefect.GetGrainBoundaryIDs(): #puts the objects back into new defect object which uses their updated IDs as the dictionary key
             objUpdatedDefect.AddGrainBoundary(objDefect.GetGrainBoundary(n))
         for m in objDefect.GetJunctionLineIDs(): #puts the objects back into new defect object which uses their updated IDs as the dictionary key
             objUpdatedDefect.AddJunctionLine(objDefect.GetJunctionLine(m))    
         self.__dctDefects[intTimeStep] = objUpdatedDefect
+        self.__UpdateMaxIDs(objUpdatedDefect)
+        for intKey in list(self.__dctMeshTrees.keys()): #only the trees of the newest time step are reused by the next correlation
+            if intKey != intTimeStep:
+                del self.__dctMeshTrees[intKey]
         return objUpdatedDefect
     def SetCellVectors(self, inCellVectors: np.array):
         self.__CellVectors = inCellVectors
     def SetBasisConversion(self,inBasisConversion: np.array):
         self.__BasisConversion = inBasisConversion
     def SetBoundaryTypes(self, inList):
-        self.__BoundaryTypes
+        self.__BoundaryTypes = inList
     def ConvertPeriodicDirections(self, inPeriodicDirections)->list:
         lstPeriodicity = ['f','f','f'] #assume fixed boundary types
         for j in inPeriodicDirections:
@@ -1487,8 +1935,6 @@ class QuantisedCuboidPoints(object):
         arrModArray = arrModArray.astype('int')
         self.__InverseScaling = np.diag(arrGridDimensions)
         self.__Scaling = np.linalg.inv(self.__InverseScaling)
-        arrCuboidPoints = np.matmul(in3DPoints, inBasisConversion)
-        arrCuboidPoints = np.matmul(arrCuboidPoints, self.__Scaling)    
         arrValues =  np.zeros([arrModArray[0],arrModArray[1],arrModArray[2]])
         self.__JunctionLinesArray = np.copy(arrValues)
         self.__GrainBoundariesArray = np.copy(arrValues)
@@ -1497,18 +1943,10 @@ class QuantisedCuboidPoints(object):
         nx,ny,nz = np.shape(arrValues)
         self.__ModArray = arrModArray
         self.__Iterations = 0
-        arrCoordinates = (np.linspace(0,nx-1,nx),np.linspace(0,ny-1,ny),
-                             np.linspace(0,nz-1,nz))
-        for m in range(len(arrCuboidPoints)):
-            k = arrCuboidPoints[m]
-            k = np.round(k,0).astype('int')
-            k = np.mod(k,self.__ModArray)
-            arrValues[k[0],k[1], k[2]] += 1
-        objInterpolate = RegularGridInterpolator(arrCoordinates, arrValues, method = 'linear')
+        arrValues += self.CountPointsInVoxels(in3DPoints)
         self.__DefectPositions = arrValues.astype('bool').astype('int')
         self.__Coordinates = gf.CreateCuboidPoints(np.array([[0,nx-1],[0,ny-1],[0,nz-1]]))
-        arrOut = objInterpolate(self.__Coordinates)
-        arrOut = np.reshape(arrOut,arrModArray)
+        arrOut = np.copy(arrValues) #linear interpolation at the grid nodes returns the node values
         arrOut = ndimage.filters.gaussian_filter(arrOut, 2, mode = 'wrap')
         fltThreshold = threshold_otsu(arrOut)
         arrOut = (arrOut > fltThreshold)
@@ -1531,20 +1969,29 @@ class QuantisedCuboidPoints(object):
             self.MergeEquivalentGrains() #if two grains are periodically linked then merge them into one
             self.MakeReturnGrains()
             self.ExpandGrains() #expand all the grains until the grain boundaries are dissolved
+    def CountPointsInVoxels(self, in3DPoints: np.array, intChunkSize = 1000000)->np.array: #number of points nearest each voxel, wrapped
+        #periodically. The points are binned intChunkSize at a time so memory does not grow with the number of points.
+        intVoxels = np.prod(self.__ModArray)
+        arrCounts = np.zeros(intVoxels, dtype='int')
+        for i in range(0, len(in3DPoints), intChunkSize):
+            arrCuboidPoints = np.matmul(np.matmul(in3DPoints[i:i+intChunkSize], self.__BasisConversion), self.__Scaling)
+            arrVoxels = np.mod(np.round(arrCuboidPoints,0).astype('int'), self.__ModArray)
+            arrCounts += np.bincount(np.ravel_multi_index(tuple(np.transpose(arrVoxels)), tuple(self.__ModArray)), minlength=intVoxels)
+        return np.reshape(arrCounts, self.__ModArray)
     def MakeReturnGrains(self):
         self.__ReturnGrains = np.copy(self.__Grains) #This array is used to evaluate all the lattice points 
         self.__ReturnGrains[self.__ReturnGrains == 0] = -1 #if they are in a defective region assign the value -1
     def GetDefectPositions(self):
         return self.__DefectPositions
-    def MergeEquivalentGrains(self):
+    def MergeEquivalentGrains(self): #the merges are applied in order to a label lookup table and then to the grid once
+        arrLabels = np.arange(np.max(self.__Grains)+1)
         for j in self.__EquivalentGrains:
             if len(j) > 0:
                 for k in j[1:]:
-                    self.__Grains[self.__Grains == k] = j[0]
-        lstValues = list(np.unique(self.__Grains))
-        lstValues.remove(0)
-        for intIndex, intValue in enumerate(lstValues):
-            self.__Grains[self.__Grains == intValue] = intIndex+1 
+                    arrLabels[arrLabels == k] = j[0]
+        arrValues = np.unique(arrLabels[1:])
+        arrLabels[1:] = np.searchsorted(arrValues, arrLabels[1:]) + 1 #renumber sequentially from 1
+        self.__Grains = arrLabels[self.__Grains].astype(self.__Grains.dtype)
         lstValues = list(np.unique(self.__Grains))
         lstValues.remove(0)
         self.__GrainLabels = lstValues        
@@ -1561,20 +2008,16 @@ class QuantisedCuboidPoints(object):
         self.__ExtendedGrains[:,:,0:n] = self.__ExtendedGrains[:,:,-2*n:-n]
         self.__ExtendedGrains[:,:,-n:] = self.__ExtendedGrains[:,:,n:2*n]
         self.__ExtendedGrains = self.__ExtendedGrains.astype('int') 
-    def CheckPeriodicGrains(self):
+    def CheckPeriodicGrains(self): #grains which meet across a cell face, found by comparing the labels on opposite faces
+        lstPairs = []
+        for j in range(3):
+            lstPairs.append(np.transpose([np.take(self.__Grains, 0, axis=j).ravel(), np.take(self.__Grains, self.__ModArray[j]-1, axis=j).ravel()]))
+        arrPairs = np.vstack(lstPairs)
+        arrPairs = np.unique(np.append(arrPairs, arrPairs[:,::-1], axis=0), axis=0)
+        arrPairs = arrPairs[np.all(arrPairs != 0, axis=1)]
         lstEquivalentGrains = []
         for intCurrentGrain in self.__GrainLabels:
-            lstMatchedGrains = [intCurrentGrain]
-            for j in range(3):
-                arrCellBoundaryPoints = self.CellBoundaryPoints(j, self.GetGrainPoints(intCurrentGrain),True)
-                arrCellBoundaryPoints[:,j] = arrCellBoundaryPoints[:,j] + self.__ModArray[j] -1
-                lstMatchedGrains.extend(list(np.unique(self.__Grains[arrCellBoundaryPoints[:,0],arrCellBoundaryPoints[:,1],arrCellBoundaryPoints[:,2]])))
-                arrCellBoundaryPoints = self.CellBoundaryPoints(j, self.GetGrainPoints(intCurrentGrain),False)
-                arrCellBoundaryPoints[:,j] = np.zeros(len(arrCellBoundaryPoints[:,j]))
-                lstMatchedGrains.extend(list(np.unique(self.__Grains[arrCellBoundaryPoints[:,0],arrCellBoundaryPoints[:,1],arrCellBoundaryPoints[:,2]])))
-            lstMatchedGrains = list(np.unique(lstMatchedGrains))
-            if 0 in lstMatchedGrains:
-                lstMatchedGrains.remove(0)
+            lstMatchedGrains = np.unique(np.append(intCurrentGrain, arrPairs[arrPairs[:,0] == intCurrentGrain,1])).tolist()
             lstEquivalentGrains.append(lstMatchedGrains)
         self.__EquivalentGrains = lstEquivalentGrains
         return lstEquivalentGrains
@@ -1918,4 +2361,47 @@ class QuantisedCuboidPoints(object):
                 lstPeriodicDirections.append(j)
         return lstPeriodicDirections
     def GetGrainBoundaryArray(self):
-        return self.__GrainBoundariesArray
\ No newline at end of file
+        return self.__GrainBoundariesArray
+
+def ReduceDumpFile(tupArguments: tuple):
+    #runs in a worker process and only returns the reduced value so that frames are never sent back to the parent
+    strFilename, fnReduce, intLatticeType, fltLatticeParameter, objAnalysis, lstColumns = tupArguments
+    try:
+        objData = LAMMPSLazyData(strFilename, intLatticeType, fltLatticeParameter, objAnalysis, lstColumns = lstColumns)
+        if len(objData.GetTimeSteps()) == 0:
+            return False, 'no complete time steps'
+        return True, fnReduce(objData)
+    except Exception as objError:
+        return False, repr(objError)
+
+def MapDumpFiles(inFiles, fnReduce, intLatticeType: int, fltLatticeParameter: float, objAnalysis = LAMMPSAnalysis3D, intWorkers = None, intChunkSize = 1, lstColumns = None):
+    #applies fnReduce to a LAMMPSLazyData object for each dump file in a process pool. inFiles is a glob pattern or a list 
+    #of file names and fnReduce must be a module level function. Files that are missing or cannot be read are skipped with 
+    #a warning but FileNotFoundError is raised if none are found. Returns the file names and results in time step order.
+    if isinstance(inFiles, str):
+        lstFilenames = glob.glob(inFiles)
+    else:
+        lstFilenames = []
+        for strFilename in inFiles:
+            if os.path.isfile(strFilename):
+                lstFilenames.append(strFilename)
+            else:
+                warnings.warn('Dump file ' + strFilename + ' is missing')
+    if len(lstFilenames) == 0:
+        raise FileNotFoundError('No dump files found for ' + str(inFiles))
+    lstFilenames = sorted(lstFilenames, key = GetFileNumber)
+    lstArguments = list(map(lambda x: (x, fnReduce, intLatticeType, fltLatticeParameter, objAnalysis, lstColumns), lstFilenames))
+    if intWorkers == 1:
+        lstResults = list(map(ReduceDumpFile, lstArguments))
+    else:
+        with ProcessPoolExecutor(max_workers = intWorkers) as objPool:
+            lstResults = list(objPool.map(ReduceDumpFile, lstArguments, chunksize = intChunkSize))
+    lstReturnFilenames = []
+    lstReturnValues = []
+    for strFilename, tupResult in zip(lstFilenames, lstResults):
+        if tupResult[0]:
+            lstReturnFilenames.append(strFilename)
+            lstReturnValues.append(tupResult[1])
+        else:
+            warnings.warn('Dump file ' + strFilename + ' was skipped: ' + tupResult[1])
+    return lstReturnFilenames, lstReturnValues
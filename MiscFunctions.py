@@ -344,56 +344,78 @@ def FlattenList(t):
 def Factorize(num):
     return [n for n in range(1, num + 1) if num % n == 0]
 
-def BootStrapRows(intLength: int,intSamples: int): #n is the number of repetitions
-    #arrPositions = np.random.randint(0,intLength,size=(intSamples,intLength))
-    arrPositions = np.random.randint(intLength,size=(intSamples,intLength))
-    arrRows = np.where(np.all(arrPositions == np.transpose(np.tile(arrPositions[:,0],[intLength,1])),axis=1))[0]
+def RandomRows(intLength: int, tupSize: tuple, intSeed=None): #the global np.random state unless a seed is given
+    if intSeed is None:
+        return np.random.randint(intLength,size=tupSize)
+    else:
+        return np.random.default_rng(intSeed).integers(intLength,size=tupSize)
+def BootStrapRows(intLength: int,intSamples: int, intSeed=None): #n is the number of repetitions
+    arrPositions = RandomRows(intLength,(intSamples,intLength),intSeed) #all resamples drawn as one integer matrix
+    arrRows = np.where(np.all(arrPositions == arrPositions[:,:1],axis=1))[0] #drop degenerate resamples of a single point
     if len(arrRows) > 0:
         arrPositions = np.delete(arrPositions,arrRows,axis= 0)
     return arrPositions.astype('int')
 def FitLine(x, a, b):
     return a*x + b
-
-def BlockBootstrapEstimate(lstX, lstY, fitFunction=None):
-    lstValues = []
-    lstAllX = []
-    lstAllY = []
-    intN = min(list(map(lambda x: len(x), lstX)))
-    for i in range(len(lstX)):
-        inX = lstX[i]
-        inY = lstY[i]
-        arrPositions = BootStrapRows(intN, 1)[0]
-        arrX = np.array(inX)[arrPositions]
-        arrY = np.array(inY)[arrPositions]
-        lstAllX.append(arrX)
-        lstAllY.append(arrY)
-    arrAllX = np.vstack(lstAllX)
-    arrAllY = np.vstack(lstAllY)
+def FitProportional(x, a):
+    return a*x
+def FitLogLine(x, a, b): #exponential, e.g. Arrhenius with x = 1/T. BatchedFit minimises the residuals of y itself like curve_fit,
+    #to fit log(y) with a line pass FitLine and np.log(y) instead
+    return np.exp(a*x + b)
+def LineDesign(inX: np.array): #the design matrix of FitLine, samples x points x parameters
+    return np.stack([inX, np.ones(np.shape(inX))], axis=-1)
+def ProportionalDesign(inX: np.array):
+    return inX[..., np.newaxis]
+dctLinearDesigns = {FitLine: LineDesign, FitProportional: ProportionalDesign} #fits solved by least squares, other functions use curve_fit
+def BatchedLeastSquares(inDesign: np.array, inY: np.array, intChunkSize = 1000): #inDesign is samples x points x parameters
+    arrScale = np.max(np.abs(inDesign), axis=(0, 1)) #column scaling keeps the QR well conditioned
+    arrScale[arrScale == 0] = 1
+    arrParameters = np.zeros([len(inDesign), np.shape(inDesign)[2]])
+    for i in range(0, len(inDesign), intChunkSize): #Q is the size of the design so only intChunkSize samples are factorised at once
+        arrDesign = inDesign[i:i+intChunkSize]/arrScale
+        arrY = inY[i:i+intChunkSize, :, np.newaxis]
+        arrQ, arrR = np.linalg.qr(arrDesign)
+        try:
+            arrParameters[i:i+intChunkSize] = np.linalg.solve(arrR, np.matmul(np.transpose(arrQ, (0, 2, 1)), arrY))[:, :, 0]
+        except np.linalg.LinAlgError: #a singular resample, fall back to the pseudo-inverse for the whole chunk
+            arrParameters[i:i+intChunkSize] = np.matmul(np.linalg.pinv(arrDesign), arrY)[:, :, 0]
+    return arrParameters/arrScale
+def BatchedFit(inX: np.array, inY: np.array, fitFunction=None, fnDesign=None): #each row of inX and inY is one data set
+    #fnDesign maps inX to the design matrix of a fitFunction linear in its parameters, FitLine and FitProportional are known already
     if fitFunction is None:
         fitFunction = FitLine
-    lstValues.append(list(map(lambda k: optimize.curve_fit(
-        fitFunction, arrAllX[:, k], arrAllY[:, k])[0][0], list(range(intN)))))
-    return lstValues
+    if fnDesign is None:
+        fnDesign = dctLinearDesigns.get(fitFunction)
+    arrX = np.asarray(inX, dtype=float)
+    arrY = np.asarray(inY, dtype=float)
+    if fitFunction is FitLogLine: #the line through log(y) starts each curve_fit
+        with np.errstate(all='ignore'):
+            arrStart = BatchedLeastSquares(np.stack([arrX, np.ones(arrX.shape)], axis=-1), np.log(arrY))
+        return np.array(list(map(lambda k: optimize.curve_fit(
+            fitFunction, arrX[k], arrY[k], p0=arrStart[k] if np.all(np.isfinite(arrStart[k])) else None)[0], range(len(arrX)))))
+    if fnDesign is not None:
+        return BatchedLeastSquares(fnDesign(arrX), arrY)
+    arrStart = optimize.curve_fit(fitFunction, arrX.ravel(), arrY.ravel())[0] #warm start every resample from the pooled fit
+    return np.array(list(map(lambda k: optimize.curve_fit(
+        fitFunction, arrX[k], arrY[k], p0=arrStart)[0], range(len(arrX)))))
+def BootstrapFit(inX, inY, intN, fitFunction=None, intSeed=None, inPositions=None, fnDesign=None):
+    if inPositions is None:
+        inPositions = BootStrapRows(len(inX), intN, intSeed)
+    return BatchedFit(np.array(inX)[inPositions], np.array(inY)[inPositions], fitFunction, fnDesign)
 
-def BootstrapEstimate(inX, inY, intN, fitFunction=None):
-    lstValues = []
-    if fitFunction is None:
-        fitFunction = FitLine
-    arrPositions = BootStrapRows(len(inX), intN)
-    lstValues = list(map(lambda k: optimize.curve_fit(
-        fitFunction, np.array(inX)[k], np.array(inY)[k])[0][0], arrPositions))
-    # for k in arrPositions:
-    # popt,pop = optimize.curve_fit(FitLine,np.array(inX)[k],np.array(inY)[k])
-    # lstValues.append(popt[0])
-    return lstValues
-def DoubleBootstrapEstimate(inX1, inY1, inX2, inY2, intN, fitFunction = None):
-    if fitFunction is None:
-        fitFunction = FitLine
-    arrPositions = BootStrapRows(len(inX1), intN)
-    lstValues1 = list(map(lambda k: optimize.curve_fit(
-        fitFunction, np.array(inX1)[k], np.array(inY1)[k])[0][0], arrPositions))
-    lstValues2 = list(map(lambda k: optimize.curve_fit(
-        fitFunction, np.array(inX2)[k], np.array(inY2)[k])[0][0], arrPositions))
+def BlockBootstrapEstimate(lstX, lstY, fitFunction=None, intSeed=None, fnDesign=None):
+    intN = min(list(map(lambda x: len(x), lstX)))
+    arrPositions = RandomRows(intN, (len(lstX), intN), intSeed) #one resample per block
+    arrAllX = np.vstack(list(map(lambda i: np.array(lstX[i])[arrPositions[i]], range(len(arrPositions)))))
+    arrAllY = np.vstack(list(map(lambda i: np.array(lstY[i])[arrPositions[i]], range(len(arrPositions)))))
+    return [list(BatchedFit(arrAllX.T, arrAllY.T, fitFunction, fnDesign)[:, 0])]
+
+def BootstrapEstimate(inX, inY, intN, fitFunction=None, intSeed=None, fnDesign=None):
+    return list(BootstrapFit(inX, inY, intN, fitFunction, intSeed, fnDesign=fnDesign)[:, 0])
+def DoubleBootstrapEstimate(inX1, inY1, inX2, inY2, intN, fitFunction = None, intSeed=None, fnDesign=None):
+    arrPositions = BootStrapRows(len(inX1), intN, intSeed)
+    lstValues1 = list(BootstrapFit(inX1, inY1, intN, fitFunction, inPositions=arrPositions, fnDesign=fnDesign)[:, 0])
+    lstValues2 = list(BootstrapFit(inX2, inY2, intN, fitFunction, inPositions=arrPositions, fnDesign=fnDesign)[:, 0])
     return lstValues1, lstValues2
 def RelativeError(inValues: np.array, inAbsoluteErrors: np.array):
     arrRelativeErrors = inAbsoluteErrors/inValues
@@ -231,6 +231,17 @@ class GenericCSLandDSC(SmithNormalForm):
         self.__Basis = inBasis
     def GetConjugateTransitionMatrix(self):
         return self.__ConjugateTransition
+    def GetRationalDenominator(self):
+        return self.__RationalDenominator
+    def IsSmithNormal(self): #checks the left and right matrices are unimodular and reproduce the diagonal form
+        arrLeft = self.GetLeftMatrix()
+        arrRight = self.GetRightMatrix()
+        arrProduct = np.matmul(arrLeft,np.matmul(self.GetOriginalMatrix(),arrRight))
+        blnReturn = False
+        if self.IsDiagonal() and np.all(np.round(arrProduct) == np.round(self.GetTransformedMatrix())):
+            if np.round(abs(np.linalg.det(arrLeft))) == 1 and np.round(abs(np.linalg.det(arrRight))) == 1:
+                blnReturn = True
+        return blnReturn
     def GetCSLPrimtiveCell(self):
         if not(self.IsDiagonal()):
             self.FindSmithNormal()
@@ -247,6 +258,8 @@ class GenericCSLandDSC(SmithNormalForm):
         return self.__LeftScaling
     def GetRightScaling(self):
         return self.__RightScaling
+    def GetDSCPrimitiveCell(self):
+        return np.matmul(np.linalg.inv(self.__RightScaling),self.GetRightCoordinates())
     def GetSigma(self):
         return self.__Sigma
     def GetLeftCoordinates(self):
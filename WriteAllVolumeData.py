@@ -20,7 +20,7 @@ intReverse = int(sys.argv[6])
 lstVolume = []
 lstTime = []
 lstSpeed = []
-objData = LT.LAMMPSData(strDirectory + '1Min.lst', 1, 4.05, LT.LAMMPSAnalysis3D)
+objData = LT.LAMMPSLazyData(strDirectory + '1Min.lst', 1, 4.05, LT.LAMMPSAnalysis3D)
 objAnalysis = objData.GetTimeStepByIndex(-1)
 intVColumn = objAnalysis.GetColumnIndex('c_v[1]')
 arrCellVectors = objAnalysis.GetCellVectors()
@@ -32,7 +32,7 @@ if intReverse == 1:
     intEco = -intEco
 while t <= intHigh and not(blnStop): 
     try:
-        objData = LT.LAMMPSData(strDirectory + '1Sim' + str(t) + '.dmp', 1, 4.05, LT.LAMMPSAnalysis3D)
+        objData = LT.LAMMPSLazyData(strDirectory + '1Sim' + str(t) + '.dmp', 1, 4.05, LT.LAMMPSAnalysis3D)
         objAnalysis = objData.GetTimeStepByIndex(-1)
         arrIDs1 = objAnalysis.GetGrainAtomIDsByEcoOrient('f_1[2]',intEco)
         if len(arrIDs1) > 0:
@@ -44,7 +44,7 @@ while t <= intHigh and not(blnStop):
             lstTime.append(t)
         else: 
             blnStop = True
-    except StopIteration:
+    except (StopIteration, EOFError): #a truncated dump file
         print('File data error', t)      
     t += intStep
 np.savetxt(strDirectory + '/Volume' + strType + '.txt', np.array([np.array(lstTime),np.array(lstVolume),np.array(lstSpeed)]))
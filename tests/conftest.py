@@ -0,0 +1,19 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) #the modules live flat in the repository root
+
+def pytest_addoption(parser):
+    parser.addoption('--runslow', action='store_true', default=False, help='also run the tests marked slow')
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'slow: long sweeps, only run with --runslow')
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--runslow'):
+        return
+    objSkip = pytest.mark.skip(reason='needs --runslow')
+    for objItem in items:
+        if 'slow' in objItem.keywords:
+            objItem.add_marker(objSkip)
@@ -0,0 +1,28 @@
+import numpy as np
+from scipy import optimize
+import MiscFunctions as mf
+
+def FitQuadratic(x, a, b):
+    return a*x**2 + b
+
+def Data(intSeed = 0):
+    objRng = np.random.default_rng(intSeed)
+    arrX = np.linspace(1, 10, 20)
+    return arrX, 3*arrX + 2 + objRng.normal(size=len(arrX))
+
+def CurveFits(inX, inY, inPositions, fitFunction):
+    return np.array(list(map(lambda k: optimize.curve_fit(fitFunction, inX[k], inY[k])[0], inPositions)))
+
+def test_known_linear_fits_match_curve_fit():
+    arrX, arrY = Data()
+    arrPositions = mf.BootStrapRows(len(arrX), 50, 1)
+    for fitFunction in [mf.FitLine, mf.FitProportional]:
+        arrFits = mf.BootstrapFit(arrX, arrY, 50, fitFunction, inPositions=arrPositions)
+        assert np.allclose(arrFits, CurveFits(arrX, arrY, arrPositions, fitFunction))
+
+def test_design_is_passed_for_other_linear_fits():
+    arrX, arrY = Data()
+    arrPositions = mf.BootStrapRows(len(arrX), 50, 2)
+    arrFits = mf.BootstrapFit(arrX, arrY, 50, FitQuadratic, inPositions=arrPositions, fnDesign=lambda x: np.stack([x**2, np.ones(np.shape(x))], axis=-1))
+    assert np.allclose(arrFits, CurveFits(arrX, arrY, arrPositions, FitQuadratic))
+    assert np.allclose(mf.BootstrapFit(arrX, arrY, 50, FitQuadratic, inPositions=arrPositions), arrFits, rtol=1e-5) #curve_fit without a design
@@ -0,0 +1,73 @@
+import os
+import numpy as np
+import pytest
+import GeneralLattice as gl
+
+def MakeDefects(intTimeStep: int)->gl.DefectObject:
+    objDefects = gl.DefectObject(intTimeStep)
+    for i in range(3):
+        objJunctionLine = gl.GeneralJunctionLine(np.random.rand(5,3), i)
+        objJunctionLine.SetAdjacentGrains([1,2,3])
+        objJunctionLine.SetAdjacentGrainBoundaries([i])
+        objJunctionLine.SetPeriodicDirections([])
+        objJunctionLine.SetAtomIDs([1,2,i])
+        objDefects.AddJunctionLine(objJunctionLine)
+        objGrainBoundary = gl.GeneralGrainBoundary(np.random.rand(7,3), i)
+        objGrainBoundary.SetAdjacentGrains([1,2])
+        objGrainBoundary.SetAdjacentJunctionLines([i])
+        objGrainBoundary.SetPeriodicDirections([])
+        objGrainBoundary.SetAtomIDs([4,i])
+        objDefects.AddGrainBoundary(objGrainBoundary)
+    return objDefects
+
+def OpenHandles()->int:
+    return len(os.listdir('/proc/self/fd'))
+
+@pytest.fixture
+def lstStores(tmp_path):
+    lstFiles = []
+    for j in range(60):
+        strFilename = str(tmp_path / (str(100*j) + '.dfz'))
+        MakeDefects(100*j).ExportData(strFilename)
+        lstFiles.append(strFilename)
+    return lstFiles
+
+def test_store_round_trip(tmp_path):
+    objDefects = MakeDefects(100)
+    objDefects.ExportData(str(tmp_path / 'a.dfz'))
+    objImported = gl.DefectObject()
+    objImported.ImportData(str(tmp_path / 'a.dfz'))
+    assert objImported.GetTimeStep() == 100
+    assert objImported.GetGrainBoundaryIDs() == objDefects.GetGrainBoundaryIDs()
+    for i in objDefects.GetGrainBoundaryIDs():
+        assert np.allclose(objImported.GetGrainBoundary(i).GetMeshPoints(), objDefects.GetGrainBoundary(i).GetMeshPoints())
+        assert objImported.GetAdjacentJunctionLines(i) == objDefects.GetAdjacentJunctionLines(i)
+    assert objImported.GetJunctionLine(2).GetAtomIDs() == [1,2,2]
+
+def test_store_rejects_text_extension(tmp_path):
+    with pytest.raises(Exception):
+        MakeDefects(0).ExportData(str(tmp_path / 'a.dfc'))
+
+@pytest.mark.skipif(not(os.path.isdir('/proc/self/fd')), reason='needs /proc to count file descriptors')
+def test_imported_stores_hold_no_handles(lstStores):
+    intHandles = OpenHandles()
+    lstDefects = []
+    for strFilename in lstStores:
+        objDefects = gl.DefectObject()
+        objDefects.ImportData(strFilename)
+        lstDefects.append(objDefects)
+    assert OpenHandles() == intHandles
+    for objDefects in lstDefects:
+        for i in objDefects.GetGrainBoundaryIDs():
+            objDefects.GetGrainBoundary(i)
+    assert OpenHandles() == intHandles
+
+@pytest.mark.skipif(not(os.path.isdir('/proc/self/fd')), reason='needs /proc to count file descriptors')
+def test_correlate_read_in_data_holds_no_handles(lstStores):
+    LT = pytest.importorskip('LAMMPSTool', exc_type=ImportError) #needs a scikit-image with skeletonize_3d
+    objCorrelate = LT.LAMMPSCorrelate()
+    intHandles = OpenHandles()
+    for strFilename in lstStores:
+        objCorrelate.ReadInData(strFilename, False)
+    assert OpenHandles() == intHandles
+    assert objCorrelate.GetTimeSteps() == list(range(0, 6000, 100))
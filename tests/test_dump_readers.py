@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+LT = pytest.importorskip('LAMMPSTool', exc_type=ImportError) #needs a scikit-image with skeletonize_3d
+
+def WriteDump(strFilename: str, lstTimeSteps: list, intAtoms = 20):
+    objRng = np.random.default_rng(0)
+    with open(strFilename, 'w') as fdata:
+        for t in lstTimeSteps:
+            fdata.write('ITEM: TIMESTEP\n' + str(t) + '\nITEM: NUMBER OF ATOMS\n' + str(intAtoms) + '\n')
+            fdata.write('ITEM: BOX BOUNDS pp pp pp\n0 10\n0 10\n0 10\nITEM: ATOMS id type x y z\n')
+            for i in range(intAtoms):
+                fdata.write(str(i+1) + ' 1 ' + ' '.join(map(str, 10*objRng.random(3))) + '\n')
+
+def TruncateDump(strFilename: str, intLines: int):
+    with open(strFilename) as fdata:
+        lstLines = fdata.readlines()
+    with open(strFilename, 'w') as fdata:
+        fdata.writelines(lstLines[:-intLines])
+
+@pytest.fixture
+def strTruncated(tmp_path):
+    strFilename = str(tmp_path / 'truncated.dmp')
+    WriteDump(strFilename, [0, 100, 200])
+    TruncateDump(strFilename, 5)
+    return strFilename
+
+def test_lazy_reader_matches_eager(tmp_path):
+    strFilename = str(tmp_path / 'complete.dmp')
+    WriteDump(strFilename, [0, 100, 200])
+    objEager = LT.LAMMPSData(strFilename, 1, 4.05, LT.LAMMPSAnalysis3D, blnUseCache=False)
+    objLazy = LT.LAMMPSLazyData(strFilename, 1, 4.05, LT.LAMMPSAnalysis3D, blnUseCache=False)
+    assert objLazy.GetTimeSteps() == objEager.GetTimeSteps() == [0, 100, 200]
+    assert np.array_equal(objLazy.GetTimeStepByIndex(-1).GetAtomData(), objEager.GetTimeStepByIndex(-1).GetAtomData())
+
+def test_truncated_dump_raises_in_both_readers(strTruncated):
+    with pytest.raises(EOFError):
+        LT.LAMMPSData(strTruncated, 1, 4.05, LT.LAMMPSAnalysis3D, blnUseCache=False)
+    with pytest.raises(EOFError):
+        LT.LAMMPSLazyData(strTruncated, 1, 4.05, LT.LAMMPSAnalysis3D, blnUseCache=False)
+
+def test_id_index_follows_edits():
+    objTimeStep = LT.LAMMPSTimeStep(0, 5, ['id','x','y','z'], ['pp','pp','pp'], [[0,10],[0,10],[0,10]])
+    objTimeStep.SetAtomData(np.column_stack([np.arange(1,6), np.arange(5)*1.0, np.zeros(5), np.zeros(5)]))
+    assert objTimeStep.GetAtomsByID([2])[0,1] == 1
+    objTimeStep.SetColumnByIndex(np.arange(11,16), 0)
+    assert objTimeStep.GetAtomsByID([12])[0,1] == 1
+    objTimeStep.GetAtomData()[:] = objTimeStep.GetAtomData()[::-1].copy() #in place edits are found on the next lookup
+    assert list(objTimeStep.GetRowIndicesByIDs([12])) == [3]
+    objTimeStep.GetRow(0)[0] = 99
+    assert objTimeStep.GetAtomsByID([99])[0,1] == 4
+    assert len(objTimeStep.GetAtomsByID([15])) == 0
+
+def PTMTimeStep(arrQuaternions: np.array, arrTypes: np.array):
+    intAtoms = len(arrQuaternions)
+    lstColumnNames = ['id','type','x','y','z'] + ['c_pt[' + str(j) + ']' for j in range(1,8)] + ['c_pe1','c_v[1]']
+    objRng = np.random.default_rng(1)
+    arrValues = np.column_stack([np.arange(1, intAtoms+1), np.ones(intAtoms), 10*objRng.random((intAtoms,3)), arrTypes,
+                                 0.1*objRng.random(intAtoms), 2.86*np.ones(intAtoms), arrQuaternions,
+                                 -3.36*np.ones(intAtoms), 16.6*np.ones(intAtoms)])
+    tupHeader = (0, intAtoms, ['pp','pp','pp'], [[0,10],[0,10],[0,10]], lstColumnNames)
+    return LT.MakeTimeStep(tupHeader, arrValues, ['%i']*2 + ['%s']*12, 'ptm.dmp', 1, 4.05, LT.LAMMPSAnalysis3D)
+
+def test_atom_ids_by_orientation_reads_the_ptm_quaternion():
+    gf = LT.gf
+    objRng = np.random.default_rng(2)
+    arrGrains = objRng.normal(size=(2,4))
+    arrGrains = arrGrains/np.linalg.norm(arrGrains, axis=1)[:,np.newaxis]
+    arrSymmetries = gf.SymmetryQuaternions('cubic')
+    arrGrainIndices = np.repeat([0,1], 30)
+    arrQuaternions = gf.QuaternionProducts(arrGrains[arrGrainIndices], arrSymmetries[objRng.integers(len(arrSymmetries), size=60)]) #symmetric equivalents
+    arrQuaternions *= objRng.choice([-1,1], size=(60,1))
+    arrTypes = np.ones(60)
+    arrTypes[::7] = 2 #other structures are never returned
+    objTimeStep = PTMTimeStep(arrQuaternions, arrTypes)
+    for i in range(2):
+        arrExpected = np.where((arrGrainIndices == i) & (arrTypes == 1))[0] + 1
+        assert sorted(objTimeStep.GetAtomIDsByOrientation(arrGrains[i], 1)) == arrExpected.tolist()
+
+def CountAtoms(objData):
+    return objData.GetTimeStepByIndex(0).GetNumberOfAtoms()
+
+def test_map_dump_files_needs_a_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        LT.MapDumpFiles(str(tmp_path / '*.dmp'), CountAtoms, 1, 4.05, intWorkers=1)
+    with pytest.warns(UserWarning), pytest.raises(FileNotFoundError):
+        LT.MapDumpFiles([str(tmp_path / '1.dmp')], CountAtoms, 1, 4.05, intWorkers=1)
+    WriteDump(str(tmp_path / '1.dmp'), [0])
+    assert LT.MapDumpFiles(str(tmp_path / '*.dmp'), CountAtoms, 1, 4.05, intWorkers=1)[1] == [20]
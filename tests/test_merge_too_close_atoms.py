@@ -0,0 +1,108 @@
+import itertools as it
+import numpy as np
+import pytest
+from scipy import spatial
+import GeometryFunctions as gf
+import GeneralLattice as gl
+import LatticeDefinitions as ld
+
+def ReferenceMerge(inPoints: np.array, inCellVectors: np.array, fltDistance: float, lstBoundaryType: list, fltDuplicateDistance: float, intLimit = 50)->np.array:
+    #the point by point merge GBOptimiser has always used, each point moves to the mean of itself and its nearest neighbours
+    arrPoints = np.copy(inPoints)
+    lstShifts = [np.array(j) for j in it.product(*[[-1,0,1] if k == 'p' else [0] for k in lstBoundaryType])]
+    for i in range(intLimit):
+        intLength = len(arrPoints)
+        arrExtended = np.vstack([arrPoints + np.matmul(j, inCellVectors) for j in lstShifts])
+        objTree = spatial.cKDTree(arrExtended)
+        lstMerged = []
+        setUsed = set()
+        for j in range(intLength):
+            arrIndices = np.array(objTree.query_ball_point(arrPoints[j], fltDistance))
+            if len(arrIndices) > 1:
+                arrDistances = np.round(np.linalg.norm(arrExtended[arrIndices] - arrPoints[j], axis=1), 5)
+                arrOrder = np.argsort(arrDistances, kind='stable')
+                arrIndices, arrDistances = arrIndices[arrOrder], arrDistances[arrOrder]
+                arrIndices = arrIndices[arrDistances <= arrDistances[1]]
+                lstMerged.append(np.mean(arrExtended[arrIndices], axis=0))
+                setUsed.update(np.mod(arrIndices, intLength).tolist())
+        if len(lstMerged) == 0:
+            return arrPoints
+        arrUnused = np.array(sorted(set(range(intLength)).difference(setUsed)), dtype='int')
+        arrPoints = np.vstack(lstMerged + [arrPoints[arrUnused]])
+        intLength = len(arrPoints)
+        arrExtended = np.vstack([arrPoints + np.matmul(j, inCellVectors) for j in lstShifts])
+        lstPairs = spatial.cKDTree(arrExtended).query_ball_point(arrPoints, fltDuplicateDistance)
+        setDuplicates = set()
+        for j in range(intLength): #any point within fltDuplicateDistance of a lower row is dropped
+            setDuplicates.update([k for k in np.mod(lstPairs[j], intLength) if k > j])
+        arrPoints = np.delete(arrPoints, sorted(setDuplicates), axis=0)
+    return arrPoints
+
+def AssertSamePoints(inPoints1: np.array, inPoints2: np.array, inCellVectors: np.array, fltTolerance = 1e-6): #equal up to row order and periodic images
+    assert len(inPoints1) == len(inPoints2)
+    arrFractional = np.matmul(inPoints1[:,np.newaxis,:] - inPoints2[np.newaxis,:,:], np.linalg.inv(inCellVectors))
+    arrFractional -= np.round(arrFractional)
+    arrDistances = np.linalg.norm(np.matmul(arrFractional, inCellVectors), axis=2)
+    arrNearest = np.argmin(arrDistances, axis=1)
+    assert np.all(arrDistances[np.arange(len(inPoints1)), arrNearest] < fltTolerance)
+    assert len(np.unique(arrNearest)) == len(inPoints1)
+
+def Bicrystal(intMax = 10): #the sigma 5 [100] cell GBOptimiser builds
+    objSigma = gl.SigmaCell(np.array([1,0,0]), ld.FCCCell, blnUseCache=False)
+    objSigma.MakeCSLCell(5)
+    fltAngle = objSigma.GetLatticeRotation()/2
+    arrSigmaBasis = objSigma.GetBasisVectors()
+    s1, s2, s3 = np.linalg.norm(arrSigmaBasis, axis=1)
+    a = 4.05
+    x = np.round(intMax/s1, 0)
+    x += np.mod(x, 2)
+    y = np.round(intMax/s2, 0)
+    y += np.mod(y, 2)
+    arrX = x*a*arrSigmaBasis[0]
+    arrXY = y*a*arrSigmaBasis[1]
+    z = a*np.round(5/s3, 0)*arrSigmaBasis[2]
+    fltAngle3, arrRotation = gf.FindRotationVectorAndAngle(np.array([1,0,0]), np.array([0,0,1]))
+    arrBasisVectors = gf.RotateVectors(fltAngle3, arrRotation, gf.StandardBasisVectors(3))
+    arrCentre = 0.5*(arrX + arrXY)
+    strConstraint = str(arrXY[0]) + '*(y -' + str(arrCentre[1]) + ') - ' + str(arrXY[1]) + '*(x -' + str(arrCentre[0]) + ')'
+    objSimulationCell = gl.SimulationCell(np.array([arrX, arrXY, z]))
+    for fltGrainAngle, strGrainConstraint in [(fltAngle, gf.InvertRegion(strConstraint)), (-fltAngle, strConstraint)]:
+        objGrain = gl.ExtrudedParallelogram(arrX, arrXY, s3*a*np.round(5/s3, 0), gf.RotateVectors(fltGrainAngle, z, arrBasisVectors), ld.FCCCell, a*np.ones(3), np.zeros(3))
+        objGrain.SetPeriodicity(['n','p','p'])
+        objGrain.ApplyGeneralConstraint(strGrainConstraint)
+        objSimulationCell.AddGrain(objGrain)
+    objSimulationCell.RemoveGrainPeriodicDuplicates()
+    return objSimulationCell, objGrain.GetNearestNeighbourDistance()
+
+@pytest.fixture(scope='module')
+def objBicrystal():
+    return Bicrystal()
+
+@pytest.mark.parametrize('fltFraction', [0.45, 0.6, 0.75, 0.9, 0.95])
+def test_bicrystal_matches_reference(objBicrystal, fltFraction):
+    objSimulationCell, fltNearest = objBicrystal
+    arrPoints = objSimulationCell.GetNonGrainAtoms([1])
+    arrCellVectors = objSimulationCell.GetRealBasisVectors()
+    lstBoundaryType = ['p','p','p'] #the SimulationCell default
+    arrMerged = gf.MergeTooCloseAtoms(arrPoints, arrCellVectors, fltFraction*fltNearest, 50, lstBoundaryType, 1e-3)
+    arrReference = ReferenceMerge(arrPoints, arrCellVectors, fltFraction*fltNearest, lstBoundaryType, 1e-3)
+    AssertSamePoints(arrMerged, arrReference, arrCellVectors)
+
+def test_overlapping_slabs_are_not_collapsed(): #chains of close points must not merge transitively into single atoms
+    arrCellVectors = 4.05*np.array([[3,0,0],[0,3,0],[0,0,3]])
+    arrNodes = 4.05*np.array([j for j in it.product(range(3), repeat=3)])
+    arrFCC = np.vstack([arrNodes + 4.05*k for k in np.array([[0,0,0],[0.5,0.5,0],[0.5,0,0.5],[0,0.5,0.5]])])
+    arrPoints = np.vstack([arrFCC, arrFCC + np.array([0.7,0.35,0.1])])
+    fltDistance = 0.9*4.05/np.sqrt(2)
+    arrMerged = gf.MergeTooCloseAtoms(arrPoints, arrCellVectors, fltDistance, 50, ['p','p','p'], 1e-3)
+    arrReference = ReferenceMerge(arrPoints, arrCellVectors, fltDistance, ['p','p','p'], 1e-3)
+    AssertSamePoints(arrMerged, arrReference, arrCellVectors)
+    assert len(arrMerged) == len(arrFCC) #each displaced atom pairs with its original
+    AssertSamePoints(arrMerged, arrFCC + np.array([0.35,0.175,0.05]), arrCellVectors)
+
+def test_distance_must_be_under_half_the_cell():
+    arrCellVectors = 4.05*np.eye(3)
+    with pytest.raises(ValueError):
+        gf.MergeTooCloseAtoms(np.random.rand(10,3), arrCellVectors, 2.1)
+    arrCellVectors = np.diag([4.05,10,10])
+    assert len(gf.MergeTooCloseAtoms(np.array([[0,0,0],[0.5,0,0]]), arrCellVectors, 2.1, 50, ['n','p','p'])) == 1 #only periodic directions are limited
@@ -0,0 +1,14 @@
+import numpy as np
+import GeometryFunctions as gf
+
+def test_pair_labels_ignore_repeated_pairs(): #repeats come from periodic images in cells only a little wider than the radius
+    arrPairs = np.array([[0,1],[0,1],[1,0],[1,0],[2,3]])
+    assert list(gf.PairLabels(arrPairs, 5, 3)) == [-1,-1,-1,-1,-1]
+    assert list(gf.PairLabels(arrPairs, 5, 2)) == [0,0,1,1,-1]
+
+def test_small_cell_counts_each_neighbour_once():
+    arrCellVectors = np.diag([2.5,10,10])
+    arrPoints = np.array([[0.1,1,1],[1.3,1,1]]) #1.2 apart directly and 1.3 apart through the x image
+    assert len(gf.CellList(arrPoints, arrCellVectors, 1.35, ['p','p','p']).Pquery_pairs()[0]) == 2
+    assert list(gf.PeriodicRadiusLabels(arrPoints, arrCellVectors, 1.35, ['p','p','p'], 3)) == [-1,-1]
+    assert list(gf.PeriodicRadiusLabels(arrPoints, arrCellVectors, 1.35, ['p','p','p'], 2)) == [0,0]
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+import GeneralLattice as gl
+import LatticeDefinitions as ld
+
+lstAxes = [np.array([0,0,1]), np.array([1,0,1]), np.array([1,1,1])]
+
+def IsSameLattice(inBasis1: np.array, inBasis2: np.array)->bool: #each basis is an integer unimodular combination of the other
+    arrTransform = np.matmul(inBasis1, np.linalg.inv(inBasis2))
+    return np.allclose(arrTransform, np.round(arrTransform), atol=1e-6) and np.round(abs(np.linalg.det(arrTransform)),6) == 1
+
+def IsSubLattice(inBasis: np.array, inSuperBasis: np.array)->bool:
+    arrCoefficients = np.matmul(inBasis, np.linalg.inv(inSuperBasis))
+    return np.allclose(arrCoefficients, np.round(arrCoefficients), atol=1e-6)
+
+def SigmaValues(inAxis: np.array, intSigmaMax = 50)->list:
+    arrSigma = gl.SigmaCell(inAxis, ld.FCCCell, blnUseCache=False).GetSigmaValues(intSigmaMax, True)
+    return sorted(set(filter(lambda x: 1 < x <= intSigmaMax, arrSigma[:,0].astype('int').tolist()))) #intSigmaMax only bounds the generator so larger sigma values are returned too
+
+lstRepresentative = [(lstAxes[0], 5), (lstAxes[0], 13), (lstAxes[0], 25), (lstAxes[1], 3), (lstAxes[1], 9), (lstAxes[1], 11),
+                     (lstAxes[2], 7), (lstAxes[2], 13), (lstAxes[2], 19)]
+
+def RoundedPoints(inPoints: np.array)->set:
+    return set(map(tuple, np.round(inPoints, 5) + 0.0)) #+0.0 so -0.0 and 0.0 agree
+
+@pytest.mark.parametrize('inAxis,intSigma', lstRepresentative)
+def test_smith_normal_matches_csl_points(inAxis, intSigma):
+    CompareCSLVectors(inAxis, intSigma)
+
+@pytest.mark.slow
+@pytest.mark.parametrize('inAxis,intSigma', [(a, s) for a in lstAxes for s in SigmaValues(a)])
+def test_smith_normal_matches_csl_points_up_to_sigma_50(inAxis, intSigma):
+    CompareCSLVectors(inAxis, intSigma)
+
+@pytest.mark.parametrize('inAxis,intSigma', lstRepresentative)
+def test_csl_points_do_not_depend_on_smith_normal(inAxis, intSigma): #both paths give the CSL points in the [0,sigma]^3 cube
+    objSigma = gl.SigmaCell(inAxis, ld.FCCCell, blnUseCache=False)
+    objSigma.MakeCSLCell(intSigma, True, True)
+    setNew = RoundedPoints(objSigma.GetCSLPoints())
+    objSigma.MakeCSLCell(intSigma, True, False)
+    assert setNew == RoundedPoints(objSigma.GetCSLPoints())
+
+def CompareCSLVectors(inAxis: np.array, intSigma: int):
+    objSigma = gl.SigmaCell(inAxis, ld.FCCCell, blnUseCache=False)
+    lstNew, lstNewBases = objSigma.GetOnlyCSLPrimitiveVectors(intSigma, 1, blnSmithNormal=True)
+    lstOld, lstOldBases = objSigma.GetOnlyCSLPrimitiveVectors(intSigma, 1, blnSmithNormal=False)
+    assert len(lstNew) == len(lstOld) > 0
+    arrPrimitive = gl.RealCell(ld.FCCCell, np.ones(3)).GetPrimitiveVectors()
+    fltVolume = abs(np.linalg.det(arrPrimitive))
+    for arrNew, arrOld, arrBasis, arrOldBasis in zip(lstNew, lstOld, lstNewBases, lstOldBases):
+        assert np.allclose(arrBasis, arrOldBasis)
+        assert IsSameLattice(arrNew, arrOld)
+        arrCSL, arrDSC = objSigma.FindSmithNormalPrimitiveVectors(arrBasis, intSigma)
+        arrRotated = np.matmul(arrPrimitive, arrBasis)
+        assert IsSameLattice(arrCSL, arrOld)
+        assert IsSubLattice(arrPrimitive, arrDSC) and IsSubLattice(arrRotated, arrDSC) #the DSC lattice holds both crystals
+        assert np.isclose(abs(np.linalg.det(arrDSC)), fltVolume/intSigma) #and is no bigger than that